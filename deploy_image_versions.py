@@ -2,6 +2,7 @@ from open_webui.models.tools import Tools, ToolForm, ToolMeta
 from open_webui.utils.plugin import load_tool_module_by_id, replace_imports
 from open_webui.utils.tools import get_tool_specs
 from open_webui.config import CACHE_DIR
+from nexus_registry_client import embed_registry_client
 
 USER_ID = "1cc1b6fb-b86f-42fd-a51a-dfb70a7a0728"
 TOOL_ID = "nexus_image_versions"
@@ -9,7 +10,7 @@ TOOL_ID = "nexus_image_versions"
 with open("/tmp/image_versions_content.py", "r") as f:
     raw_content = f.read()
 
-content = replace_imports(raw_content)
+content = replace_imports(embed_registry_client(raw_content))
 
 meta = ToolMeta(description="Search Docker images in Nexus registry and show last 5 latest versions")
 form = ToolForm(id=TOOL_ID, name="Nexus Image Versions", content=content, meta=meta, access_control=None)
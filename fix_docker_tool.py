@@ -4,20 +4,16 @@ from open_webui.utils.plugin import load_tool_module_by_id, replace_imports
 from open_webui.utils.tools import get_tool_specs
 from open_webui.config import CACHE_DIR
 from pathlib import Path
+from nexus_registry_client import embed_registry_client
 
 USER_ID = "1cc1b6fb-b86f-42fd-a51a-dfb70a7a0728"
 TOOL_ID = "nexus_docker_images"
 
-content = replace_imports(textwrap.dedent('''
+content = replace_imports(embed_registry_client(textwrap.dedent('''
 """
 description: List Docker images and generate Dockerfiles from Nexus private registry
 """
-import os, requests
-
-REGISTRY = os.getenv("NEXUS_REGISTRY", "http://ai-nexus:5001").rstrip("/")
-USER = os.getenv("NEXUS_USER", "admin")
-PASS = os.getenv("NEXUS_PASS", "r")
-PULL_REGISTRY = "localhost:5001"
+# <nexus_registry_client>
 
 DOCKERFILE_TEMPLATES = {
     "python": """FROM {image}
@@ -160,89 +156,236 @@ EXPOSE 8080
 CMD ["java", "-jar", "app.jar"]"""
 }
 
+# Build-performance variants: dependency manifests copied before the sources, package manager caches on BuildKit cache mounts
+OPTIMIZED_DOCKERFILE_TEMPLATES = {
+    "python": """FROM {image}
+
+WORKDIR /app
+ENV PIP_DISABLE_PIP_VERSION_CHECK=1
+COPY requirements.txt .
+RUN --mount=type=cache,target=/root/.cache/pip pip install -r requirements.txt
+COPY . .
+EXPOSE 8000
+CMD ["python", "app.py"]""",
+
+    "node": """FROM {image}
+
+WORKDIR /usr/src/app
+COPY package*.json ./
+RUN --mount=type=cache,target=/root/.npm npm ci --omit=dev
+COPY . .
+EXPOSE 3000
+ENV NODE_ENV=production
+CMD ["node", "app.js"]""",
+
+    "golang": """FROM {image} AS builder
+
+WORKDIR /app
+COPY go.mod go.sum ./
+RUN --mount=type=cache,target=/go/pkg/mod go mod download
+COPY . .
+RUN --mount=type=cache,target=/go/pkg/mod --mount=type=cache,target=/root/.cache/go-build CGO_ENABLED=0 GOOS=linux go build -o main .
+
+FROM {alpine_image}
+WORKDIR /app
+COPY --from=builder /app/main .
+EXPOSE 8080
+CMD ["./main"]""",
+
+    "maven": """FROM {image} AS builder
+
+WORKDIR /app
+COPY pom.xml .
+RUN --mount=type=cache,target=/root/.m2 mvn -B dependency:go-offline
+COPY src ./src
+RUN --mount=type=cache,target=/root/.m2 mvn -B package -DskipTests
+
+FROM {eclipse_image}
+WORKDIR /app
+COPY --from=builder /app/target/*.jar app.jar
+EXPOSE 8080
+CMD ["java", "-jar", "app.jar"]""",
+
+    "java": """FROM {image} AS builder
+
+WORKDIR /app
+COPY pom.xml .
+RUN --mount=type=cache,target=/root/.m2 mvn -B dependency:go-offline
+COPY src ./src
+RUN --mount=type=cache,target=/root/.m2 mvn -B package -DskipTests
+
+FROM {eclipse_image}
+WORKDIR /app
+COPY --from=builder /app/target/*.jar app.jar
+EXPOSE 8080
+CMD ["java", "-jar", "app.jar"]""",
+
+    "rust": """FROM {image} AS builder
+
+WORKDIR /app
+COPY Cargo.toml Cargo.lock ./
+RUN mkdir src && echo "fn main() {{}}" > src/main.rs
+RUN --mount=type=cache,target=/usr/local/cargo/registry cargo build --release
+COPY src ./src
+RUN --mount=type=cache,target=/usr/local/cargo/registry touch src/main.rs && cargo build --release
+
+FROM {alpine_image}
+WORKDIR /app
+COPY --from=builder /app/target/release/app .
+EXPOSE 8080
+CMD ["./app"]""",
+
+    "ruby": """FROM {image}
+
+WORKDIR /app
+COPY Gemfile Gemfile.lock ./
+RUN --mount=type=cache,target=/usr/local/bundle/cache bundle config set --local without 'development test' && bundle install
+COPY . .
+EXPOSE 3000
+CMD ["ruby", "app.rb"]""",
+
+    "gradle": """FROM {image} AS builder
+
+WORKDIR /app
+ENV GRADLE_USER_HOME=/cache/gradle
+COPY build.gradle settings.gradle ./
+COPY gradle ./gradle
+RUN --mount=type=cache,target=/cache/gradle gradle dependencies --no-daemon
+COPY src ./src
+RUN --mount=type=cache,target=/cache/gradle gradle build --no-daemon -x test
+
+FROM {eclipse_image}
+WORKDIR /app
+COPY --from=builder /app/build/libs/*.jar app.jar
+EXPOSE 8080
+CMD ["java", "-jar", "app.jar"]"""
+}
+
+# .dockerignore for the optimized variant: keep VCS data, local build output and dependency stores out of the build context
+DOCKERIGNORE_COMMON = [".git", ".gitlab-ci.yml", ".dockerignore", "Dockerfile*", ".env", "*.log", ".idea", ".vscode"]
+DOCKERIGNORE_TEMPLATES = {
+    "python": ["__pycache__/", "*.pyc", ".venv/", "venv/", ".pytest_cache/", ".cache/"],
+    "node": ["node_modules/", "coverage/", ".npm/"],
+    "golang": ["bin/", ".go/"],
+    "php": [".composer-cache/"],
+    "maven": ["target/", ".m2/"],
+    "java": ["target/", ".m2/"],
+    "rust": ["target/", ".cargo/"],
+    "dotnet": ["bin/", "obj/", ".nuget/"],
+    "ruby": [".bundle/", "vendor/bundle/"],
+    "gradle": ["build/", ".gradle/"]
+}
+
+# Helper image role (see IMAGE_ROLES) -> template placeholder that consumes it
+HELPER_ROLES = {
+    "alpine": "{alpine_image}",
+    "jre": "{eclipse_image}"
+}
+
+# Single-stage templates run from {image} itself: pick the smallest tag of these
+# variants within the newest version instead of the full image, unless the
+# template compiles native code (NATIVE_BUILD_STEPS), which needs the toolchain
+# of the full image
+RUNTIME_TAG_VARIANTS = {
+    "python": ("slim",),
+    "node": ("alpine", "slim"),
+    "ruby": ("slim", "alpine"),
+    "php": ("alpine",),
+    "nginx": ("alpine",)
+}
+NATIVE_BUILD_STEPS = ("bundle install", "gem install", "docker-php-ext-install", "pecl install")
+
 class Tools:
-    def list_docker_images(self, query: str = "") -> str:
-        """List available Docker images from Nexus and generate a Dockerfile. Pass a simple keyword: python, node, nginx, java, golang, mongo, redis, php, maven, postgres, alpine, rust, dotnet, ruby, gradle, etc."""
-        auth = (USER, PASS)
+    def list_docker_images(self, query: str = "", max_repos: int = 5, max_tags: int = 5, token_budget: int = 1500, cursor: int = 0, variant: str = "classic") -> str:
+        """List available Docker images from Nexus and generate a Dockerfile. Pass a simple keyword: python, node, nginx, java, golang, mongo, redis, php, maven, postgres, alpine, rust, dotnet, ruby, gradle, etc.
+        max_repos: how many best-matching repositories to list (default 5)
+        max_tags: newest tags to show per repository (default 5)
+        token_budget: approximate token limit for the image list (default 1500)
+        cursor: offset into the ranked repositories, use the value reported in the previous result to page
+        variant: 'classic' Dockerfile, or 'optimized' for BuildKit cache mounts, dependency layers split from sources and a .dockerignore"""
+        client = get_client()
         try:
-            catalog = requests.get(f"{REGISTRY}/v2/_catalog", auth=auth, timeout=10)
-            catalog.raise_for_status()
-            repos = catalog.json().get("repositories", [])
-
-            if query:
-                query_words = [w.lower().strip() for w in query.replace(",", " ").split() if len(w.strip()) > 1]
-                matched_repos = []
-                for repo in repos:
-                    repo_lower = repo.lower()
-                    for word in query_words:
-                        if word in repo_lower:
-                            matched_repos.append(repo)
-                            break
-                repos = matched_repos
+            # Ranked fuzzy match over the cached catalog's token/trigram index
+            ranked = client.search(query, limit=None)
+            cursor = max(int(cursor or 0), 0)
+            repos = ranked[cursor:cursor + max(int(max_repos or 1), 1)]
 
             if not repos:
+                if ranked:
+                    return f"No more images for '{query}': {len(ranked)} repositories matched in total (cursor={cursor})."
                 tech = query.strip()
                 return f"{tech} image is not available in your private Nexus registry.\\nPlease upload the required image first:\\n\\ndocker pull {tech}:<tag>\\ndocker tag {tech}:<tag> {PULL_REGISTRY}/apm-repo/demo/{tech}:<tag>\\ndocker push {PULL_REGISTRY}/apm-repo/demo/{tech}:<tag>"
 
-            results = []
-            for repo in repos:
-                resp = requests.get(f"{REGISTRY}/v2/{repo}/tags/list", auth=auth, timeout=10)
-                resp.raise_for_status()
-                data = resp.json()
-                results.append({
-                    "repository": data.get("name", repo),
-                    "tags": data.get("tags", [])
-                })
-
-            # Build image list
-            image_list = "Available images in private Nexus registry:\\n"
-            for r in results:
-                for tag in r["tags"]:
-                    image_list += f"  - {PULL_REGISTRY}/{r['repository']}:{tag}\\n"
-
-            # Find alpine image for multi-stage builds
-            alpine_image = f"{PULL_REGISTRY}/apm-repo/demo/alpine:latest"
-            for repo in catalog.json().get("repositories", []):
-                if "alpine" in repo.lower() and "curl" not in repo.lower():
-                    try:
-                        aresp = requests.get(f"{REGISTRY}/v2/{repo}/tags/list", auth=auth, timeout=5)
-                        atags = aresp.json().get("tags", [])
-                        if atags:
-                            alpine_image = f"{PULL_REGISTRY}/{repo}:{atags[0]}"
-                            break
-                    except:
-                        pass
-
-            # Find eclipse-temurin for java
-            eclipse_image = f"{PULL_REGISTRY}/apm-repo/demo/eclipse-temurin:latest"
-            for repo in catalog.json().get("repositories", []):
-                if "eclipse-temurin" in repo.lower() or "amazoncorretto" in repo.lower():
-                    try:
-                        eresp = requests.get(f"{REGISTRY}/v2/{repo}/tags/list", auth=auth, timeout=5)
-                        etags = eresp.json().get("tags", [])
-                        if etags:
-                            eclipse_image = f"{PULL_REGISTRY}/{repo}:{etags[0]}"
-                            break
-                    except:
-                        pass
-
-            # Generate Dockerfile if template exists
+            # Resolve this page's repositories and the helper images the template needs in one parallel fetch
             tech_key = query.lower().strip()
-            best_image = f"{PULL_REGISTRY}/{results[0]['repository']}:{results[0]['tags'][0]}"
+            optimized = variant.lower().strip() == "optimized"
+            template = (OPTIMIZED_DOCKERFILE_TEMPLATES.get(tech_key) if optimized else None) or DOCKERFILE_TEMPLATES.get(tech_key, "")
+            roles = [role for role, placeholder in HELPER_ROLES.items() if placeholder in template]
+            helpers, tag_map = client.resolve_roles(roles, extra_repos=repos)
+            results = [{"repository": repo, "tags": sort_tags(tag_map[repo])} for repo in repos]
 
-            if tech_key in DOCKERFILE_TEMPLATES:
-                dockerfile = DOCKERFILE_TEMPLATES[tech_key].format(
+            # Build image list: newest tags first, stop at the token budget
+            image_list = "Available images in private Nexus registry:\\n"
+            used = estimate_tokens(image_list)
+            shown_repos = 0
+            omitted_tags = 0
+            for r in results:
+                shown = 0
+                for tag in r["tags"][:max(int(max_tags or 1), 1)]:
+                    line = f"  - {PULL_REGISTRY}/{r['repository']}:{tag}\\n"
+                    if used + estimate_tokens(line) > token_budget:
+                        break
+                    image_list += line
+                    used += estimate_tokens(line)
+                    shown += 1
+                if not shown and r["tags"]:
+                    break
+                shown_repos += 1
+                if shown < len(r["tags"]):
+                    omitted_tags += len(r["tags"]) - shown
+                    image_list += f"    ({len(r['tags']) - shown} older tags of {r['repository']} omitted)\\n"
+
+            remaining = len(ranked) - cursor - shown_repos
+            if remaining > 0 or omitted_tags:
+                image_list += f"Omitted: {remaining} more repositories, {omitted_tags} older tags."
+                if remaining > 0:
+                    image_list += f" Call again with cursor={cursor + shown_repos} for the next page."
+                image_list += "\\n"
+
+            # Helper images for multi-stage builds (alpine runtime, JRE for java)
+            alpine_image = f"{PULL_REGISTRY}/{helpers.get('alpine') or 'apm-repo/demo/alpine:latest'}"
+            eclipse_image = f"{PULL_REGISTRY}/{helpers.get('jre') or 'apm-repo/demo/eclipse-temurin:latest'}"
+
+            # Generate Dockerfile if template exists; builder stages keep the newest full image
+            best_ref = f"{results[0]['repository']}:{results[0]['tags'][0]}"
+            compiles = any(step in template for step in NATIVE_BUILD_STEPS)
+            if tech_key in RUNTIME_TAG_VARIANTS and " AS builder" not in template and not compiles:
+                best_ref = client.smallest_image([results[0]["repository"]], tag_map, RUNTIME_TAG_VARIANTS[tech_key])
+            best_image = f"{PULL_REGISTRY}/{best_ref}"
+
+            if template:
+                dockerfile = template.format(
                     image=best_image,
                     alpine_image=alpine_image,
                     eclipse_image=eclipse_image
                 )
+                runtime_image = dockerfile.rsplit("FROM ", 1)[1].split()[0]
+                repo, _, tag = runtime_image[len(PULL_REGISTRY) + 1:].rpartition(":")
+                pull_size = client.image_size(repo, tag)
+                if pull_size:
+                    dockerfile += f"\\n\\nRuntime image {runtime_image}: ~{pull_size / 1e6:.1f} MB compressed pull."
+                if optimized:
+                    dockerignore = "\\n".join(DOCKERIGNORE_COMMON + DOCKERIGNORE_TEMPLATES.get(tech_key, []))
+                    dockerfile += f"\\n\\n.dockerignore:\\n\\n{dockerignore}"
+                    if tech_key in OPTIMIZED_DOCKERFILE_TEMPLATES:
+                        dockerfile += "\\n\\nRUN --mount=type=cache needs BuildKit (docker buildx, or DOCKER_BUILDKIT=1 before Docker 23)."
                 return f"{image_list}\\n---\\nDockerfile using private Nexus registry:\\n\\n{dockerfile}\\n\\nIMPORTANT: All FROM images above use the private Nexus registry ({PULL_REGISTRY}). NEVER replace them with public Docker Hub images."
             else:
                 return f"{image_list}\\nUse these images with format: FROM {PULL_REGISTRY}/<repository>:<tag>\\nNEVER use public Docker Hub images."
 
         except Exception as e:
             return f"Error connecting to Nexus registry: {str(e)}"
-''').strip())
+''').strip()))
 
 meta = ToolMeta(description="List Docker images and generate Dockerfiles from Nexus private registry")
 form = ToolForm(id=TOOL_ID, name="Nexus Docker Images", content=content, meta=meta, access_control=None)
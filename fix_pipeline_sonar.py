@@ -4,25 +4,22 @@ from open_webui.utils.plugin import load_tool_module_by_id, replace_imports
 from open_webui.utils.tools import get_tool_specs
 from open_webui.config import CACHE_DIR
 from pathlib import Path
+from nexus_registry_client import embed_registry_client
 
 USER_ID = "1cc1b6fb-b86f-42fd-a51a-dfb70a7a0728"
 TOOL_ID = "gitlab_pipeline_generator"
 
-content = replace_imports(textwrap.dedent('''
+content = replace_imports(embed_registry_client(textwrap.dedent('''
 """
 description: Generate GitLab CI pipeline YAML using Nexus private registry images
 """
-import os, requests
-
-REGISTRY = os.getenv("NEXUS_REGISTRY", "http://ai-nexus:5001").rstrip("/")
-USER = os.getenv("NEXUS_USER", "admin")
-PASS = os.getenv("NEXUS_PASS", "r")
-PULL_REGISTRY = "localhost:5001"
+# <nexus_registry_client>
+from collections import OrderedDict
 
 COMPILE_SCRIPTS = {
     "java": ["mvn clean package -DskipTests", "find target -maxdepth 1 -name \\"*.jar\\" ! -name \\"*-sources*\\" ! -name \\"original-*\\" | head -1 | xargs -I {} cp {} target/app.jar"],
-    "python": ["pip install --no-cache-dir -r requirements.txt", "python -m compileall ."],
-    "node": ["npm ci", "npm run build"],
+    "python": ["pip install -r requirements.txt", "python -m compileall ."],
+    "node": ["npm ci --prefer-offline --no-audit", "npm run build"],
     "golang": ["go mod download", "CGO_ENABLED=0 go build -o app ."],
     "php": ["composer install --no-dev --optimize-autoloader"],
     "dotnet": ["dotnet restore", "dotnet publish -c Release -o out"],
@@ -31,28 +28,240 @@ COMPILE_SCRIPTS = {
     "gradle": ["gradle dependencies --no-daemon", "gradle build --no-daemon -x test"]
 }
 
-IMAGE_MAP = {
-    "java": "maven",
-    "python": "python",
-    "node": "node",
-    "golang": "golang",
-    "go": "golang",
-    "php": "php",
-    "dotnet": "dotnet",
-    "aspnet": "dotnet",
-    "rust": "rust",
-    "sonarqube": "sonar-scanner",
-    "sonar": "sonar-scanner",
-    "quality": "sonar-scanner",
-    "nginx": "nginx",
-    "redis": "redis",
-    "mongo": "mongo",
-    "postgres": "postgres",
-    "maven": "maven",
-    "alpine": "alpine",
-    "ruby": "ruby",
-    "gradle": "gradle"
+# Dependency stores kept inside the project dir so GitLab can cache them; downstream jobs read them from the cache
+DEPENDENCY_VARIABLES = {
+    "java": {"MAVEN_OPTS": "-Dmaven.repo.local=${CI_PROJECT_DIR}/.m2/repository"},
+    "gradle": {"GRADLE_USER_HOME": "${CI_PROJECT_DIR}/.gradle"},
+    "python": {"PIP_CACHE_DIR": "${CI_PROJECT_DIR}/.cache/pip"},
+    "node": {"npm_config_cache": "${CI_PROJECT_DIR}/.npm"},
+    "golang": {"GOMODCACHE": "${CI_PROJECT_DIR}/.go/pkg/mod", "GOCACHE": "${CI_PROJECT_DIR}/.go/cache"},
+    "rust": {"CARGO_HOME": "${CI_PROJECT_DIR}/.cargo"},
+    "dotnet": {"NUGET_PACKAGES": "${CI_PROJECT_DIR}/.nuget/packages"},
+    "php": {"COMPOSER_CACHE_DIR": "${CI_PROJECT_DIR}/.composer-cache"},
+    "ruby": {"BUNDLE_PATH": "${CI_PROJECT_DIR}/vendor/bundle"}
+}
+
+# Dependency caches keyed by the lockfile hash: a new cache only when dependencies change.
+# node_modules is cached with the npm store, so jobs after compile skip npm ci for an unchanged lockfile
+DEPENDENCY_CACHES = {
+    "java": {"files": ["pom.xml"], "paths": [".m2/repository"]},
+    "gradle": {"files": ["build.gradle", "gradle/wrapper/gradle-wrapper.properties"], "paths": [".gradle/caches", ".gradle/wrapper"]},
+    "python": {"files": ["requirements.txt"], "paths": [".cache/pip"]},
+    "node": {"files": ["package-lock.json"], "paths": [".npm", "node_modules"]},
+    "golang": {"files": ["go.sum"], "paths": [".go/pkg/mod", ".go/cache"]},
+    "rust": {"files": ["Cargo.lock"], "paths": [".cargo/registry/index", ".cargo/registry/cache", ".cargo/git/db"]},
+    "dotnet": {"files": ["packages.lock.json"], "paths": [".nuget/packages"]},
+    "php": {"files": ["composer.lock"], "paths": [".composer-cache"]},
+    "ruby": {"files": ["Gemfile.lock"], "paths": ["vendor/bundle"]}
+}
+
+# Build outputs handed from compile to later jobs; dependency stores go through the cache, never artifacts.
+# Gradle also gets its project task history (.gradle/<version>/) so compile tasks are up to date downstream,
+# .NET the restore output that --no-restore commands read
+COMPILE_ARTIFACTS = {
+    "java": ["target/app.jar", "target/classes/"],
+    "gradle": ["build/libs/", "build/classes/", ".gradle/*/executionHistory/", ".gradle/*/fileHashes/", ".gradle/buildOutputCleanup/"],
+    "node": ["dist/", "build/"],
+    "golang": ["app"],
+    "php": ["vendor/"],
+    "dotnet": ["out/", "**/obj/project.assets.json"],
+    "rust": ["target/release/"]
 }
+ARTIFACT_EXCLUDES = {
+    "rust": ["target/release/deps/**", "target/release/build/**", "target/release/incremental/**", "target/release/.fingerprint/**"]
+}
+
+# Artifact/cache zip compression (FF_USE_FASTZIP): fast levels trade a little size for much less CPU time
+COMPRESSION_LEVELS = ["fastest", "fast", "default", "slow", "slowest"]
+
+# Static analysis run on top of the compile job output: no clean, no dependency download.
+# Findings fail the job, which is allow_failure, so they show as a warning instead of a silent pass
+ANALYSIS_SCRIPTS = {
+    "java": ["mvn spotbugs:check -DskipTests", "mvn pmd:check -DskipTests"],
+    "gradle": ["gradle check -x test --no-daemon"],
+    "node": ["test -d node_modules || npm ci --prefer-offline --no-audit", "npx --no-install eslint . -f json -o eslint-report.json", "npm audit --omit=dev --audit-level=high"],
+    "dotnet": ["dotnet format --verify-no-changes --no-restore --report format-report.json"],
+    "python": ["pip install bandit", "bandit -r . -f json -o bandit-report.json"],
+    "golang": ["go vet -json ./... > go-vet.json 2>&1"],
+    "rust": ["cargo clippy --release --message-format=json > clippy.json"]
+}
+
+ANALYSIS_REPORTS = {
+    "java": ["target/spotbugsXml.xml", "target/pmd.xml"],
+    "gradle": ["build/reports/spotbugs/", "build/reports/pmd/"],
+    "node": ["eslint-report.json"],
+    "dotnet": ["format-report.json"],
+    "python": ["bandit-report.json"],
+    "golang": ["go-vet.json"],
+    "rust": ["clippy.json"]
+}
+
+# Compiled class directories SonarQube reads instead of rebuilding
+SONAR_BINARIES = {
+    "java": "target/classes",
+    "gradle": "build/classes"
+}
+
+# Build output, vendored code and dependency stores the scanner skips; the common entries are the job caches and reports
+SONAR_EXCLUSIONS = {
+    "java": ["target/**", ".m2/**"],
+    "gradle": ["build/**", ".gradle/**"],
+    "python": [".cache/**", "**/__pycache__/**", ".venv/**", "venv/**"],
+    "node": ["node_modules/**", "dist/**", "build/**", "coverage/**", ".npm/**"],
+    "golang": ["vendor/**", ".go/**", "app"],
+    "php": ["vendor/**", ".composer-cache/**"],
+    "dotnet": ["bin/**", "obj/**", "out/**", ".nuget/**"],
+    "rust": ["target/**", ".cargo/**"],
+    "ruby": ["vendor/**"]
+}
+SONAR_COMMON_EXCLUSIONS = [".sonar/**", ".scannerwork/**", ".trivycache/**", "junit/**"]
+
+# Kaniko layer cache in a dedicated Nexus repository; TTL, snapshot mode and compression are overridable CI variables
+KANIKO_CACHE_VARIABLES = {
+    "KANIKO_CACHE_REPO": "${NEXUS_REGISTRY}/apm-repo/cache/${IMAGE_NAME}",
+    "KANIKO_CACHE_TTL": "168h",
+    "KANIKO_SNAPSHOT_MODE": "redo",
+    "KANIKO_COMPRESSED_CACHING": "false"
+}
+DIGEST_EXPORT = """ --digest-file "${CI_PROJECT_DIR}/image.digest"
+    - echo "IMAGE_DIGEST=$(cat image.digest)" > image.env
+  artifacts:
+    reports:
+      dotenv: image.env"""
+KANIKO_CACHE_FLAGS = ' --cache=true --cache-repo "${KANIKO_CACHE_REPO}" --cache-ttl "${KANIKO_CACHE_TTL}" --snapshot-mode "${KANIKO_SNAPSHOT_MODE}" --compressed-caching="${KANIKO_COMPRESSED_CACHING}" --insecure-registry "${NEXUS_REGISTRY}"'
+
+# Unit test sharding: test file discovery, source root pattern stripped to match JUnit class names, runner and reports.
+# Discovery runs under the runner's `set -eo pipefail`, so only existing test roots are searched
+TEST_SHARDING = {
+    "java": {
+        "files": "for d in src/test/java; do [ ! -d \\"$d\\" ] || find \\"$d\\" -name '*Test.java' -o -name '*Tests.java'; done",
+        "root": "src/test/java/",
+        "run": ["TESTS=$(sed -e 's#.*/##' -e 's#[.]java$##' shard-files.txt | paste -sd, -)", 'mvn test -Dtest="$TESTS" -Dsurefire.failIfNoSpecifiedTests=false'],
+        "reports": "target/surefire-reports/TEST-*.xml"
+    },
+    "gradle": {
+        "files": "for d in src/test/java src/test/kotlin; do [ ! -d \\"$d\\" ] || find \\"$d\\" -name '*Test.*'; done",
+        "root": "src/test/[a-z]*/",
+        "run": ["gradle test --no-daemon $(sed -e 's#^src/test/[a-z]*/##' -e 's#[.][a-z]*$##' -e 's#/#.#g' -e 's#^#--tests #' shard-files.txt)"],
+        "reports": "build/test-results/test/TEST-*.xml"
+    },
+    "python": {
+        "files": "find . -path ./.cache -prune -o -name 'test_*.py' -print | sed 's#^[.]/##'",
+        "root": "",
+        "run": ["pip install -r requirements.txt pytest", "python -m pytest -o junit_family=xunit1 --junitxml=report.xml $(cat shard-files.txt)"],
+        "reports": "report.xml"
+    },
+    "node": {
+        "files": "find . -path ./node_modules -prune -o \\\\( -name '*.test.[jt]s' -o -name '*.spec.[jt]s' \\\\) -print | sed 's#^[.]/##'",
+        "root": "",
+        "run": ["npm ci --prefer-offline --no-audit", "npx --no-install jest --ci --reporters=default --reporters=jest-junit $(cat shard-files.txt)"],
+        "reports": "junit.xml",
+        "variables": {"JEST_JUNIT_ADD_FILE_ATTRIBUTE": "true"}
+    }
+}
+TIMINGS_URL = "${CI_API_V4_URL}/projects/${CI_PROJECT_ID}/jobs/artifacts/${CI_DEFAULT_BRANCH}/raw/junit-merged.xml?job=unit_test_report"
+
+# Trivy runs from the Nexus image and pulls its vulnerability DBs from OCI artifacts mirrored into Nexus
+TRIVY_VARIABLES = {
+    "TRIVY_CACHE_DIR": ".trivycache/",
+    "TRIVY_DB_REPOSITORY": "${NEXUS_REGISTRY}/apm-repo/trivy-db:2",
+    "TRIVY_JAVA_DB_REPOSITORY": "${NEXUS_REGISTRY}/apm-repo/trivy-java-db:1",
+    "TRIVY_DB_MAX_AGE_HOURS": "24",
+    "TRIVY_USERNAME": "${NEXUS_USERNAME}",
+    "TRIVY_PASSWORD": "${NEXUS_PASSWORD}",
+    "TRIVY_INSECURE": "true",
+    "TRIVY_NO_PROGRESS": "true"
+}
+TRIVY_DB_CHECK = """      if find "${TRIVY_CACHE_DIR}db/metadata.json" -mmin -$((TRIVY_DB_MAX_AGE_HOURS * 60)) 2>/dev/null | grep -q .; then
+        SKIP_UPDATE="--skip-db-update --skip-java-db-update"
+      fi"""
+TRIVY_MIRROR_VARIABLES = {
+    "TRIVY_DB_UPSTREAM": "ghcr.io/aquasecurity/trivy-db:2",
+    "TRIVY_JAVA_DB_UPSTREAM": "ghcr.io/aquasecurity/trivy-java-db:1",
+    "TRIVY_DB_REPOSITORY": "${NEXUS_REGISTRY}/apm-repo/trivy-db:2",
+    "TRIVY_JAVA_DB_REPOSITORY": "${NEXUS_REGISTRY}/apm-repo/trivy-java-db:1"
+}
+
+# Incremental mode: files whose changes make a job worth running; compile and image jobs also watch the image definition
+SOURCE_GLOBS = {
+    "java": ["src/**/*", "pom.xml"],
+    "gradle": ["src/**/*", "*.gradle", "*.gradle.kts", "gradle/**/*"],
+    "python": ["**/*.py", "requirements*.txt", "pyproject.toml", "setup.cfg"],
+    "node": ["src/**/*", "**/*.{js,ts,jsx,tsx}", "package.json", "package-lock.json"],
+    "golang": ["**/*.go", "go.mod", "go.sum"],
+    "php": ["**/*.php", "composer.json", "composer.lock"],
+    "dotnet": ["**/*.cs", "**/*.csproj", "**/*.sln", "packages.lock.json"],
+    "rust": ["src/**/*", "Cargo.toml", "Cargo.lock"],
+    "ruby": ["**/*.rb", "Gemfile", "Gemfile.lock"]
+}
+RUNTIME_GLOBS = ["Dockerfile", ".dockerignore"]
+CHANGE_SCOPES = {
+    "compile": "runtime",
+    "unit_test": "source",
+    "sast": "source",
+    "quality": "source",
+    "build": "runtime",
+    "test": "runtime",
+    "security": "runtime",
+    "push": "runtime"
+}
+
+# Monorepo mode: stages generated per technology as parallel:matrix jobs over the services
+MONOREPO_STAGES = ["compile", "build", "security"]
+
+# Pipeline profiles: "build_once" compiles a single time and fans every analysis job out of that build,
+# "feedback" also splits merge request pipelines (FAST_STAGES only) from default branch and scheduled ones
+PROFILES = {
+    "standard": {"mode": None, "ensure_compile": False, "split": False},
+    "build_once": {"mode": "dag", "ensure_compile": True, "split": False},
+    "feedback": {"mode": "dag", "ensure_compile": True, "split": True}
+}
+
+# Feedback profile: workflow:rules set PIPELINE_PROFILE, jobs outside FAST_STAGES only run when it is "full"
+FAST_STAGES = ["compile", "unit_test", "quality"]
+WORKFLOW_RULES = """# Merge requests and feature branches: compile, unit tests and Sonar PR analysis; default branch and schedules: full pipeline
+workflow:
+  rules:
+    - if: '$CI_PIPELINE_SOURCE == "merge_request_event"'
+      variables:
+        PIPELINE_PROFILE: "fast"
+    - if: '$CI_COMMIT_BRANCH == $CI_DEFAULT_BRANCH || $CI_PIPELINE_SOURCE == "schedule"'
+      variables:
+        PIPELINE_PROFILE: "full"
+    - if: '$CI_COMMIT_BRANCH && $CI_OPEN_MERGE_REQUESTS'
+      when: never
+    - if: '$CI_COMMIT_BRANCH'
+      variables:
+        PIPELINE_PROFILE: "fast\\""""
+FULL_ONLY_RULE = "\\n    - if: '$PIPELINE_PROFILE != \\"full\\"'\\n      when: never"
+
+# SonarQube: full git history for blame and new code, branch/PR analysis unless SONAR_BRANCH_ANALYSIS is "false" (Community Edition)
+SONAR_VARIABLES = {
+    "SONAR_USER_HOME": "${CI_PROJECT_DIR}/.sonar",
+    "GIT_DEPTH": "0",
+    "SONAR_BRANCH_ANALYSIS": "true"
+}
+# Merge requests analyse only their changes against the target branch, other branches against the main branch
+SONAR_SCOPE = """    - |
+      SONAR_SCOPE=""
+      if [ "${SONAR_BRANCH_ANALYSIS}" = "true" ]; then
+        if [ -n "${CI_MERGE_REQUEST_IID}" ]; then
+          SONAR_SCOPE="-Dsonar.pullrequest.key=${CI_MERGE_REQUEST_IID} -Dsonar.pullrequest.branch=${CI_MERGE_REQUEST_SOURCE_BRANCH_NAME} -Dsonar.pullrequest.base=${CI_MERGE_REQUEST_TARGET_BRANCH_NAME}"
+        elif [ "${CI_COMMIT_BRANCH}" != "${CI_DEFAULT_BRANCH}" ]; then
+          SONAR_SCOPE="-Dsonar.branch.name=${CI_COMMIT_BRANCH}"
+        fi
+      fi"""
+# Scanner plugins and the analysis working directory per branch; a new branch starts from the default branch's cache
+SONAR_CACHE = """
+  cache:
+    key: sonar-${CI_COMMIT_REF_SLUG}
+    fallback_keys:
+      - sonar-${CI_DEFAULT_BRANCH}
+    paths:
+      - .sonar/cache
+      - .scannerwork"""
+
+# IMAGE_MAP (technology -> image keyword) is defined by the registry client and shared with its search synonyms
 
 # When technology is a stage name, map to default stages
 STAGE_ALIASES = {
@@ -62,6 +271,8 @@ STAGE_ALIASES = {
     "security": "security",
     "sast": "sast",
     "test": "test",
+    "unit_test": "unit_test",
+    "unittest": "unit_test",
     "build": "build",
     "compile": "compile",
     "push": "push",
@@ -69,12 +280,180 @@ STAGE_ALIASES = {
     "deploy": "push"
 }
 
+# Stage images resolved per request: name -> catalog keyword (first keyword with a match wins)
+STAGE_IMAGE_KEYWORDS = {
+    "kaniko": ["kaniko"],
+    "alpine": ["alpine-curl", "alpine"],
+    "trivy": ["trivy"],
+    "sonar": ["sonar-scanner"],
+    "oras": ["oras"]
+}
+
+ALL_STAGES = ["compile", "unit_test", "build", "test", "sast", "quality", "security", "push", "notify"]
+
+# Job generated for each stage
+STAGE_JOBS = {
+    "compile": "compile",
+    "unit_test": "unit_tests",
+    "build": "build_image",
+    "test": "test_image",
+    "sast": "static_analysis",
+    "quality": "sonarqube",
+    "security": "trivy_scan",
+    "push": "push_release",
+    "notify": "notify_success"
+}
+
+# Jobs whose artifacts each stage downloads
+STAGE_DEPENDENCIES = {
+    "unit_test": ["compile"],
+    "build": ["compile"],
+    "test": ["build"],
+    "sast": ["compile"],
+    "quality": ["compile"],
+    "push": ["test"]
+}
+
+# DAG mode: upstream stages each stage really needs; analysis only needs the compile output, not the image
+STAGE_NEEDS = {
+    "compile": [],
+    "unit_test": ["compile"],
+    "build": ["compile"],
+    "test": ["build"],
+    "sast": ["compile"],
+    "quality": ["compile"],
+    "security": ["build"],
+    "push": ["test", "unit_test", "security"],
+    "notify": ["push"]
+}
+
+# Typical job durations in minutes, used for the critical path estimate
+STAGE_MINUTES = {
+    "compile": 3,
+    "unit_test": 2,
+    "build": 4,
+    "test": 1,
+    "sast": 4,
+    "quality": 3,
+    "security": 1,
+    "push": 1,
+    "notify": 1
+}
+RUNNER_CONCURRENCY = 3
+
+# Rendered pipelines keyed by request arguments plus the registry snapshot version
+RENDER_CACHE = OrderedDict()
+RENDER_CACHE_SIZE = 128
+
+def dependency_cache(tech, policy, shared=False):
+    """cache: block for a technology's dependency store; compile fills it (pull-push), later jobs only read it (pull).
+    shared: one key per technology instead of per lockfile, for monorepo services with their own lockfiles"""
+    spec = DEPENDENCY_CACHES.get(tech)
+    if not spec:
+        return ""
+    files = "".join(f"\\n        - {f}" for f in spec["files"])
+    key = f" {tech}-deps" if shared else f"\\n      files:{files}\\n      prefix: {tech}-deps"
+    paths = "".join(f"\\n      - {p}" for p in spec["paths"])
+    return f"""
+  cache:
+    key:{key}
+    paths:{paths}
+    policy: {policy}"""
+
+def parse_services(services):
+    """'path:technology, path:technology' -> [(path, technology)]"""
+    entries = []
+    for item in services.split(","):
+        path, _, service_tech = item.strip().partition(":")
+        if path.strip():
+            entries.append((path.strip().strip("/"), service_tech.strip().lower() or "java"))
+    return entries
+
+def job_rules(paths=(), full_only=False, when="on_success"):
+    """rules: block, empty when the job always runs.
+    paths: only add the job when one of them changed; full_only: drop the job from fast (merge request) pipelines"""
+    entries = FULL_ONLY_RULE if full_only else ""
+    if paths:
+        entries += "\\n    - changes:" + "".join(f'\\n        - "{p}"' for p in paths)
+        if when != "on_success":
+            entries += f"\\n      when: {when}"
+    elif entries:
+        entries += f"\\n    - when: {when}"
+    return "\\n  rules:" + entries if entries else ""
+
+def artifact_block(paths, expire_in, excludes=(), prefix=""):
+    """artifacts: block with explicit paths only, empty when the job hands nothing downstream"""
+    if not paths:
+        return ""
+    # A leading * would start a YAML alias
+    block = "\\n  artifacts:\\n    paths:" + "".join(f"\\n      - {prefix}{p}" if prefix or not p.startswith("*") else f'\\n      - "{p}"' for p in paths)
+    if excludes:
+        block += "\\n    exclude:" + "".join(f"\\n      - {prefix}{e}" for e in excludes)
+    return block + f"\\n    expire_in: {expire_in}"
+
+def artifact_expiry(minutes):
+    """Keep pipeline-internal artifacts for a few pipeline durations so retries still find them"""
+    return f"{max(1, -(-minutes * 3 // 60))} hours" if minutes * 3 > 60 else "1 hour"
+
+def job_variables(variables):
+    """Job-level variables: block, empty when there is nothing to set"""
+    if not variables:
+        return ""
+    return "\\n  variables:" + "".join(f'\\n    {k}: "{v}"' for k, v in variables.items())
+
+def resolve_needs(stage, present):
+    """Upstream stages of a stage in DAG mode, looking through stages that are not generated"""
+    needs = []
+    pending = list(STAGE_NEEDS.get(stage, []))
+    while pending:
+        upstream = pending.pop(0)
+        if upstream in present:
+            if upstream not in needs:
+                needs.append(upstream)
+        else:
+            pending.extend(STAGE_NEEDS.get(upstream, []))
+    return needs
+
+def critical_path(present, edges):
+    """Longest chain of needs by estimated duration -> (stages, minutes)"""
+    finish = {}
+    chain = {}
+    for stage in present:
+        previous = max(edges[stage], key=lambda s: finish[s], default=None)
+        finish[stage] = STAGE_MINUTES.get(stage, 1) + (finish[previous] if previous else 0)
+        chain[stage] = (chain[previous] if previous else []) + [stage]
+    last = max(present, key=lambda s: finish[s])
+    return chain[last], finish[last]
+
+def estimate_minutes(present, edges, runners):
+    """Wall clock estimate when at most `runners` jobs run at once"""
+    done = {}
+    running = []
+    pending = list(present)
+    now = 0
+    while pending or running:
+        ready = [s for s in pending if all(u in done for u in edges[s])]
+        for stage in ready[:max(runners - len(running), 0)]:
+            running.append((now + STAGE_MINUTES.get(stage, 1), stage))
+            pending.remove(stage)
+        running.sort()
+        now, stage = running.pop(0)
+        done[stage] = now
+    return now
+
 class Tools:
-    def get_pipeline_template(self, technology: str = "java", stages: str = "all") -> str:
+    def get_pipeline_template(self, technology: str = "java", stages: str = "all", mode: str = "stages", profile: str = "standard", layer_cache: bool = True, test_shards: int = 4, incremental: bool = False, services: str = "", compression_level: str = "fast") -> str:
         """Generate a complete .gitlab-ci.yml pipeline for a technology. Returns ready-to-use YAML.
         technology: java, python, node, golang, php, dotnet, rust, sonarqube, trivy
-        stages: 'all' for complete pipeline, or comma-separated like: compile,build,test,quality,security"""
-        auth = (USER, PASS)
+        stages: 'all' for complete pipeline, or comma-separated like: compile,build,test,quality,security
+        mode: 'stages' to run stages strictly in order, or 'dag' to emit needs: so independent jobs run in parallel
+        profile: 'standard', 'build_once' to compile a single time and run every analysis job on that build (implies dag), or 'feedback' for build_once plus workflow:rules that limit merge request and branch pipelines to compile, unit tests and Sonar PR analysis while the default branch and schedules run the full pipeline
+        layer_cache: cache Kaniko image layers in the Nexus apm-repo/cache repository, with a scheduled cleanup job
+        test_shards: parallel unit test jobs; tests are balanced by the last run's JUnit timings (java, gradle, python, node)
+        incremental: add jobs only when their files changed (rules:changes); image build, scan and push are skipped when no runtime files changed and the last image digest is reused (implies dag)
+        services: monorepo mode, comma-separated service paths with their technology like: services/api:java,services/web:node. Each technology gets one parallel:matrix job per stage (compile, build, security) instead of one job per service; other stages, profile and incremental do not apply and are listed as ignored at the top of the YAML
+        compression_level: artifact and cache compression with FastZip: fastest, fast, default, slow, slowest"""
+        client = get_client()
         tech = technology.lower().strip()
 
         # If technology is actually a stage name, use java as default tech and that as stage
@@ -85,40 +464,79 @@ class Tools:
                 stages = actual_stages
             actual_tech = "java"  # default tech for standalone stage requests
 
-        # Find images from Nexus
-        image_keyword = IMAGE_MAP.get(actual_tech, actual_tech)
-        try:
-            catalog = requests.get(f"{REGISTRY}/v2/_catalog", auth=auth, timeout=10)
-            catalog.raise_for_status()
-            repos = catalog.json().get("repositories", [])
-
-            def find_image(keyword):
-                matched = [r for r in repos if keyword.lower() in r.lower()]
-                if matched:
-                    resp = requests.get(f"{REGISTRY}/v2/{matched[0]}/tags/list", auth=auth, timeout=10)
-                    resp.raise_for_status()
-                    tags = resp.json().get("tags", [])
-                    if tags:
-                        return f"${{NEXUS_PULL_REGISTRY}}/{matched[0]}:{tags[0]}"
-                return ""
-
-            main_image = find_image(image_keyword)
-            kaniko_image = find_image("kaniko")
-            alpine_image = find_image("alpine-curl") or find_image("alpine")
-            trivy_image = find_image("trivy")
-            sonar_image = find_image("sonar-scanner")
+        service_entries = parse_services(services or "")
+        service_techs = sorted({t for _, t in service_entries})
 
+        # Resolve every stage image from one catalog snapshot, fetching all tag lists in parallel
+        keywords = dict(STAGE_IMAGE_KEYWORDS, main=[IMAGE_MAP.get(actual_tech, actual_tech)])
+        keywords.update({f"main:{t}": [IMAGE_MAP.get(t, t)] for t in service_techs})
+        try:
+            # Kaniko cache and Trivy DB repositories would otherwise match tech keywords ("apm-repo/cache/python-api")
+            repos = client.image_catalog()
+            stage_repos = {}
+            for name, options in keywords.items():
+                stage_repos[name] = [next((r for r in repos if kw.lower() in r.lower()), None) for kw in options]
+            tag_map = client.tags_many([r for options in stage_repos.values() for r in options if r])
         except Exception as e:
             return f"Error connecting to Nexus registry: {str(e)}"
 
-        if not main_image and actual_tech in COMPILE_SCRIPTS:
+        images = {}
+        for name, options in stage_repos.items():
+            images[name] = next((f"${{NEXUS_PULL_REGISTRY}}/{r}:{tag_map[r][0]}" for r in options if r and tag_map.get(r)), "")
+        main_image = images["main"]
+        kaniko_image = images["kaniko"]
+        alpine_image = images["alpine"]
+        trivy_image = images["trivy"]
+        sonar_image = images["sonar"]
+        oras_image = images["oras"]
+
+        missing = [t for t in service_techs if not images[f"main:{t}"]]
+        if missing:
+            return f"{', '.join(missing)} image is not available in your private Nexus registry. Please upload the required image to your Nexus repository first."
+        if not main_image and actual_tech in COMPILE_SCRIPTS and not service_entries:
             return f"{actual_tech} image is not available in your private Nexus registry. Please upload the required image to your Nexus repository first."
 
-        requested = [s.strip() for s in stages.split(",")] if stages != "all" else ["compile", "build", "test", "sast", "quality", "security", "push", "notify"]
+        requested = [s.strip() for s in stages.split(",")] if stages != "all" else list(ALL_STAGES)
+        # Monorepo mode only generates MONOREPO_STAGES; whatever else was asked for is reported in the YAML header
+        monorepo_ignored = []
+        if service_entries:
+            monorepo_ignored = [s for s in requested if s not in MONOREPO_STAGES]
+            if profile.lower().strip() != "standard":
+                monorepo_ignored.append(f"profile={profile}")
+            if incremental:
+                monorepo_ignored.append("incremental")
+            requested = [s for s in requested if s in MONOREPO_STAGES]
+        settings = PROFILES.get(profile.lower().strip(), PROFILES["standard"])
+        if settings["ensure_compile"] and "compile" not in requested and ({"sast", "quality"} & set(requested)):
+            requested.insert(0, "compile")
+        dag = (settings["mode"] or mode).lower().strip() == "dag" or bool(incremental)
+        split = settings["split"] and not service_entries
+        compression_level = compression_level.lower().strip() if compression_level.lower().strip() in COMPRESSION_LEVELS else "fast"
+
+        # Identical requests against an unchanged registry snapshot reuse the rendered YAML
+        cache_key = (actual_tech, tuple(requested), dag, bool(layer_cache), int(test_shards or 1), bool(incremental), tuple(service_entries), tuple(monorepo_ignored), compression_level, split, client.version)
+        if cache_key in RENDER_CACHE:
+            RENDER_CACHE.move_to_end(cache_key)
+            return RENDER_CACHE[cache_key]
 
         compile_scripts = COMPILE_SCRIPTS.get(actual_tech, [f"echo \\"Building {actual_tech} application...\\""])
+        dependency_variables = DEPENDENCY_VARIABLES.get(actual_tech, {})
+        # Internal artifacts live for a few times the expected pipeline duration
+        planned = [s for s in ALL_STAGES if s in requested]
+        if dag:
+            expiry = artifact_expiry(estimate_minutes(planned, {s: resolve_needs(s, planned) for s in planned}, RUNNER_CONCURRENCY))
+        else:
+            expiry = artifact_expiry(sum(STAGE_MINUTES.get(s, 1) for s in planned))
+        # Analysis reuses the compile job's classes (artifacts) and dependency store (cache); without a compile job it builds on its own
+        reuse_build = "compile" in requested and bool(main_image)
+        source_globs = SOURCE_GLOBS.get(actual_tech, ["**/*"])
+        change_paths = {"source": source_globs, "runtime": source_globs + RUNTIME_GLOBS}
+        # Jobs skipped by rules:changes must not block the jobs that need them
+        optional_need = "\\n      optional: true" if incremental else ""
 
         yaml_parts = []
+        jobs = {}
+        extra_jobs = []
 
         # Header
         yaml_parts.append("stages:\\n  - " + "\\n  - ".join(requested))
@@ -133,42 +551,232 @@ class Tools:
   DOCKER_TLS_CERTDIR: ""
   DOCKER_HOST: "tcp://docker:2375"
   FF_NETWORK_PER_BUILD: "true"
+  FF_USE_FASTZIP: "true"
+  ARTIFACT_COMPRESSION_LEVEL: "{compression_level}"
+  CACHE_COMPRESSION_LEVEL: "{compression_level}"
   SONAR_HOST_URL: "http://ai-sonarqube:9000"
   SONAR_TOKEN: "${{SONAR_TOKEN}}"
 """)
 
+        if service_entries:
+            # One matrix job per technology and stage: YAML size and wall time stay flat as services are added
+            for service_tech in service_techs:
+                paths = [path for path, t in service_entries if t == service_tech]
+                matrix = "\\n  parallel:\\n    matrix:\\n      - SERVICE: [" + ", ".join(f'"{path}"' for path in paths) + "]"
+                # Each matrix instance waits only for the upstream instance of its own service
+                same_service = "\\n      parallel:\\n        matrix:\\n          - SERVICE: $[[ matrix.SERVICE ]]"
+                service_image = f"${{NEXUS_REGISTRY}}/apm-repo/demo/${{CI_PROJECT_NAME}}-$(basename \\"${{SERVICE}}\\")"
+                if "compile" in requested:
+                    scripts = "\\n".join([f"    - {s}" for s in COMPILE_SCRIPTS.get(service_tech, [f"echo \\"Building {service_tech} service...\\""])])
+                    yaml_parts.append(f"""compile_{service_tech}:
+  stage: compile
+  image: {images[f"main:{service_tech}"]}
+  tags:
+    - docker{job_variables(DEPENDENCY_VARIABLES.get(service_tech, {}))}{matrix}
+  before_script:
+    - cd "${{SERVICE}}"
+  script:
+{scripts}{artifact_block(COMPILE_ARTIFACTS.get(service_tech, []), expiry, ARTIFACT_EXCLUDES.get(service_tech, []), "${SERVICE}/")}{dependency_cache(service_tech, "pull-push", shared=True)}
+  needs: []""")
+                if "build" in requested and kaniko_image:
+                    # Services of one technology share a layer cache repository, named after the project so it never equals a tech keyword
+                    kaniko_variables = dict(KANIKO_CACHE_VARIABLES, KANIKO_CACHE_REPO=KANIKO_CACHE_VARIABLES["KANIKO_CACHE_REPO"].replace("${IMAGE_NAME}", "${CI_PROJECT_NAME}-" + service_tech))
+                    build_needs = f"\\n    - job: compile_{service_tech}{same_service}\\n      artifacts: true" if "compile" in requested else " []"
+                    yaml_parts.append(f"""build_{service_tech}:
+  stage: build
+  image:
+    name: {kaniko_image}
+    entrypoint: [""]
+  tags:
+    - docker{job_variables(kaniko_variables if layer_cache else {})}{matrix}
+  script:
+    - SERVICE_IMAGE="{service_image}"
+    - mkdir -p /kaniko/.docker
+    - echo "{{\\"auths\\":{{\\"${{NEXUS_REGISTRY}}\\":{{\\"username\\":\\"${{NEXUS_USERNAME}}\\",\\"password\\":\\"${{NEXUS_PASSWORD}}\\"}}}}}}" > /kaniko/.docker/config.json
+    - /kaniko/executor --context "${{CI_PROJECT_DIR}}/${{SERVICE}}" --dockerfile "${{CI_PROJECT_DIR}}/${{SERVICE}}/Dockerfile" --destination "${{SERVICE_IMAGE}}:${{IMAGE_TAG}}" --destination "${{SERVICE_IMAGE}}:latest" --insecure --skip-tls-verify{KANIKO_CACHE_FLAGS if layer_cache else ""}
+  needs:{build_needs}""")
+                if "security" in requested and trivy_image:
+                    scan_needs = f"\\n    - job: build_{service_tech}{same_service}\\n      artifacts: false" if "build" in requested and kaniko_image else " []"
+                    yaml_parts.append(f"""scan_{service_tech}:
+  stage: security
+  image:
+    name: {trivy_image}
+    entrypoint: [""]
+  tags:
+    - docker{job_variables(TRIVY_VARIABLES)}{matrix}
+  script:
+    - |
+{TRIVY_DB_CHECK}
+    - trivy image $SKIP_UPDATE --severity HIGH,CRITICAL "{service_image}:latest"
+  cache:
+    key: trivy-db
+    paths:
+      - .trivycache/
+  allow_failure: true
+  needs:{scan_needs}""")
+
+            if monorepo_ignored:
+                yaml_parts.insert(0, f"# Ignored in monorepo mode (only {', '.join(MONOREPO_STAGES)} are generated): {', '.join(monorepo_ignored)}")
+            yaml_parts.insert(0, f"# Monorepo: {len(service_entries)} services across {len(service_techs)} technologies, one parallel:matrix job per technology and stage")
+            rendered = "\\n\\n".join(yaml_parts)
+            RENDER_CACHE[cache_key] = rendered
+            while len(RENDER_CACHE) > RENDER_CACHE_SIZE:
+                RENDER_CACHE.popitem(last=False)
+            return rendered
+
+        if split:
+            yaml_parts.append(WORKFLOW_RULES)
+
         if "compile" in requested and main_image:
             scripts = "\\n".join([f"    - {s}" for s in compile_scripts])
-            yaml_parts.append(f"""compile:
+            jobs["compile"] = f"""compile:
   stage: compile
   image: {main_image}
   tags:
-    - docker
+    - docker{job_variables(dependency_variables)}
   script:
-{scripts}
-  artifacts:
-    paths:
-      - target/
-      - .
-    expire_in: 1 hour""")
+{scripts}{artifact_block(COMPILE_ARTIFACTS.get(actual_tech, []), expiry, ARTIFACT_EXCLUDES.get(actual_tech, []))}{dependency_cache(actual_tech, "pull-push")}"""
 
         if "build" in requested and kaniko_image:
-            yaml_parts.append(f"""build_image:
+            jobs["build"] = f"""build_image:
   stage: build
   image:
     name: {kaniko_image}
     entrypoint: [""]
   tags:
-    - docker
+    - docker{job_variables(KANIKO_CACHE_VARIABLES if layer_cache else {})}
   script:
     - mkdir -p /kaniko/.docker
     - echo "{{\\"auths\\":{{\\"${{NEXUS_REGISTRY}}\\":{{\\"username\\":\\"${{NEXUS_USERNAME}}\\",\\"password\\":\\"${{NEXUS_PASSWORD}}\\"}}}}}}" > /kaniko/.docker/config.json
-    - /kaniko/executor --context "${{CI_PROJECT_DIR}}" --dockerfile "${{CI_PROJECT_DIR}}/Dockerfile" --destination "${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:${{IMAGE_TAG}}" --destination "${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:latest" --insecure --skip-tls-verify
-  dependencies:
-    - compile""")
+    - /kaniko/executor --context "${{CI_PROJECT_DIR}}" --dockerfile "${{CI_PROJECT_DIR}}/Dockerfile" --destination "${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:${{IMAGE_TAG}}" --destination "${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:latest" --insecure --skip-tls-verify{KANIKO_CACHE_FLAGS if layer_cache else ""}{DIGEST_EXPORT if incremental else ""}"""
+
+            if layer_cache and alpine_image:
+                # Scheduled pipelines prune cache layers older than the TTL; Nexus frees the blobs in its cleanup task
+                extra_jobs.append(f"""kaniko_cache_cleanup:
+  stage: build
+  image: {alpine_image}
+  tags:
+    - docker{job_variables(KANIKO_CACHE_VARIABLES)}
+  before_script:
+    - apk add --no-cache curl jq
+  script:
+    - |
+      REPO="${{KANIKO_CACHE_REPO#*/}}"
+      AUTH="${{NEXUS_USERNAME}}:${{NEXUS_PASSWORD}}"
+      ACCEPT="Accept: application/vnd.docker.distribution.manifest.v2+json"
+      CUTOFF=$(( $(date +%s) - ${{KANIKO_CACHE_TTL%h}} * 3600 ))
+      for TAG in $(curl -s -u "$AUTH" "http://${{NEXUS_REGISTRY}}/v2/${{REPO}}/tags/list" | jq -r '.tags[]?'); do
+        CONFIG=$(curl -s -u "$AUTH" -H "$ACCEPT" "http://${{NEXUS_REGISTRY}}/v2/${{REPO}}/manifests/${{TAG}}" | jq -r '.config.digest')
+        CREATED=$(curl -sL -u "$AUTH" "http://${{NEXUS_REGISTRY}}/v2/${{REPO}}/blobs/${{CONFIG}}" | jq -r '.created // empty' | cut -c1-19 | tr T ' ')
+        if [ -n "$CREATED" ] && [ "$(date -u -d "$CREATED" +%s)" -lt "$CUTOFF" ]; then
+          DIGEST=$(curl -sI -u "$AUTH" -H "$ACCEPT" "http://${{NEXUS_REGISTRY}}/v2/${{REPO}}/manifests/${{TAG}}" | awk 'tolower($1)=="docker-content-digest:" {{print $2}}' | tr -cd 'a-z0-9:')
+          curl -s -u "$AUTH" -X DELETE "http://${{NEXUS_REGISTRY}}/v2/${{REPO}}/manifests/${{DIGEST}}" && echo "Pruned cache layer ${{TAG}} (created $CREATED)"
+        fi
+      done
+  rules:
+    - if: '$CI_PIPELINE_SOURCE == "schedule"'
+  needs: []
+  allow_failure: true""")
+
+        sharding = TEST_SHARDING.get(actual_tech)
+        if "unit_test" in requested and main_image and sharding:
+            shards = max(int(test_shards or 1), 1)
+            run = "".join(f"\\n        {line}" for line in sharding["run"])
+            jobs["unit_test"] = f"""unit_tests:
+  stage: unit_test
+  image: {main_image}
+  tags:
+    - docker{job_variables(dict(dependency_variables, TIMINGS_URL=TIMINGS_URL, **sharding.get("variables", {})))}
+  parallel: {shards}
+  script:
+    - |
+      touch timings.xml
+      (curl -sf -H "JOB-TOKEN: ${{CI_JOB_TOKEN}}" -o timings.xml "${{TIMINGS_URL}}" || wget -q --header "JOB-TOKEN: ${{CI_JOB_TOKEN}}" -O timings.xml "${{TIMINGS_URL}}") 2>/dev/null || echo "No timing history, splitting by file count"
+      {sharding["files"]} | sort > test-files.txt
+    - |
+      awk -v shards="${{CI_NODE_TOTAL:-1}}" -v shard="${{CI_NODE_INDEX:-1}}" -v root="{sharding["root"]}" -v project="${{CI_PROJECT_DIR}}/" -v q='"' '
+        function key(path) {{
+          if (index(path, project) == 1) path = substr(path, length(project) + 1)
+          sub("^" root, "", path)
+          sub("[.][^./]*$", "", path)
+          gsub("/", ".", path)
+          return path
+        }}
+        FILENAME == "timings.xml" {{
+          n = split($0, cases, "<testcase")
+          for (i = 2; i <= n; i++) {{
+            name = ""
+            if (match(cases[i], "file=" q "[^" q "]*" q)) name = key(substr(cases[i], RSTART + 6, RLENGTH - 7))
+            else if (match(cases[i], "classname=" q "[^" q "]*" q)) name = substr(cases[i], RSTART + 11, RLENGTH - 12)
+            if (name != "" && match(cases[i], "time=" q "[^" q "]*" q)) spent[name] += substr(cases[i], RSTART + 6, RLENGTH - 7)
+          }}
+          next
+        }}
+        {{
+          files[++count] = $0
+          k = key($0)
+          for (c in spent) if (c == k || index(c, k ".") == 1) weight[count] += spent[c]
+          if (weight[count] > 0) {{ known += weight[count]; timed++ }}
+        }}
+        END {{
+          for (i = 1; i <= count; i++) {{
+            if (weight[i] <= 0) weight[i] = timed ? known / timed : 1
+            order[i] = i
+          }}
+          for (i = 2; i <= count; i++)
+            for (j = i; j > 1 && weight[order[j]] > weight[order[j - 1]]; j--) {{ t = order[j]; order[j] = order[j - 1]; order[j - 1] = t }}
+          for (i = 1; i <= count; i++) {{
+            best = 1
+            for (s = 2; s <= shards; s++) if (load[s] < load[best]) best = s
+            load[best] += weight[order[i]]
+            if (best == shard) print files[order[i]]
+          }}
+        }}' timings.xml test-files.txt > shard-files.txt
+    - echo "Shard ${{CI_NODE_INDEX}}/${{CI_NODE_TOTAL}} runs $(wc -l < shard-files.txt) of $(wc -l < test-files.txt) test files"
+    - |
+      if [ -s shard-files.txt ]; then{run}
+      fi
+  after_script:
+    - mkdir -p junit/shard-${{CI_NODE_INDEX}}
+    - cp {sharding["reports"]} junit/shard-${{CI_NODE_INDEX}}/ 2>/dev/null || true
+  artifacts:
+    when: always
+    paths:
+      - junit/
+    reports:
+      junit: junit/**/*.xml
+    expire_in: {expiry}{dependency_cache(actual_tech, "pull")}"""
+
+            if alpine_image:
+                # One merged report per pipeline; the next pipeline reads its timings to balance the shards
+                report_rules = job_rules(change_paths["source"] if incremental else (), when="always") or "\\n  when: always"
+                extra_jobs.append(f"""unit_test_report:
+  stage: unit_test
+  image: {alpine_image}
+  tags:
+    - docker
+  script:
+    - |
+      {{
+        echo '<?xml version="1.0" encoding="UTF-8"?>'
+        echo '<testsuites>'
+        find junit -name '*.xml' | sort | while read -r report; do
+          awk '{{ gsub(/<[?]xml[^>]*>/, ""); gsub(/<[/]?testsuites[^>]*>/, ""); print }}' "$report"
+        done
+        echo '</testsuites>'
+      }} > junit-merged.xml
+  artifacts:
+    paths:
+      - junit-merged.xml
+    reports:
+      junit: junit-merged.xml
+    expire_in: 30 days
+  needs:
+    - job: unit_tests
+      artifacts: true{optional_need}{report_rules}""")
 
         if "test" in requested and alpine_image:
-            yaml_parts.append(f"""test_image:
+            jobs["test"] = f"""test_image:
   stage: test
   image: {alpine_image}
   tags:
@@ -184,63 +792,89 @@ class Tools:
       else
         echo "ERROR: Image not found (HTTP $RESPONSE)"
         exit 1
-      fi
-  dependencies:
-    - build_image""")
+      fi"""
 
         if "sast" in requested and main_image:
-            yaml_parts.append(f"""static_analysis:
+            analysis_scripts = ANALYSIS_SCRIPTS.get(actual_tech, [f"echo \\"No static analyzer configured for {actual_tech}\\""])
+            if not reuse_build:
+                analysis_scripts = compile_scripts + analysis_scripts
+            scripts = "\\n".join([f"    - {s}" for s in analysis_scripts])
+            reports = ANALYSIS_REPORTS.get(actual_tech, [])
+            report_paths = "".join(f"\\n      - {r}" for r in reports)
+            report_artifacts = f"""
+  artifacts:
+    paths:{report_paths}
+    when: always
+    expire_in: 1 week""" if reports else ""
+            jobs["sast"] = f"""static_analysis:
   stage: sast
   image: {main_image}
   tags:
-    - docker
+    - docker{job_variables(dependency_variables)}
   script:
     - echo "=== Running Static Analysis ==="
-    - mvn clean compile spotbugs:check -DskipTests || true
-    - mvn pmd:check -DskipTests || true
-  artifacts:
-    paths:
-      - target/spotbugsXml.xml
-      - target/pmd.xml
-    when: always
-  allow_failure: true""")
+{scripts}{report_artifacts}{dependency_cache(actual_tech, "pull")}
+  allow_failure: true"""
 
         if "quality" in requested:
             scan_image = sonar_image if sonar_image else main_image
+            binaries = f" -Dsonar.java.binaries={SONAR_BINARIES[actual_tech]}" if reuse_build and actual_tech in SONAR_BINARIES else ""
+            exclusions = ",".join(SONAR_EXCLUSIONS.get(actual_tech, []) + SONAR_COMMON_EXCLUSIONS)
             if scan_image:
-                yaml_parts.append(f"""sonarqube:
+                jobs["quality"] = f"""sonarqube:
   stage: quality
   image: {scan_image}
   tags:
-    - docker
-  variables:
-    SONAR_USER_HOME: "${{CI_PROJECT_DIR}}/.sonar"
+    - docker{job_variables(SONAR_VARIABLES)}
   script:
     - echo "=== Running SonarQube Analysis ==="
-    - sonar-scanner -Dsonar.projectKey=${{CI_PROJECT_NAME}} -Dsonar.projectName="${{CI_PROJECT_NAME}}" -Dsonar.host.url=${{SONAR_HOST_URL}} -Dsonar.token=${{SONAR_TOKEN}} -Dsonar.sources=.
-  allow_failure: true""")
+{SONAR_SCOPE}
+    - sonar-scanner -Dsonar.projectKey=${{CI_PROJECT_NAME}} -Dsonar.projectName="${{CI_PROJECT_NAME}}" -Dsonar.host.url=${{SONAR_HOST_URL}} -Dsonar.token=${{SONAR_TOKEN}} -Dsonar.sources=. -Dsonar.exclusions="{exclusions}"{binaries} ${{SONAR_SCOPE}}{SONAR_CACHE}
+  allow_failure: true"""
 
-        if "security" in requested and alpine_image and trivy_image:
-            yaml_parts.append(f"""trivy_scan:
+        if "security" in requested and trivy_image:
+            jobs["security"] = f"""trivy_scan:
   stage: security
-  image: {alpine_image}
-  services:
-    - name: {trivy_image}
-      alias: trivy-server
-      command: ["server", "--listen", "0.0.0.0:8080"]
+  image:
+    name: {trivy_image}
+    entrypoint: [""]
   tags:
-    - docker
+    - docker{job_variables(TRIVY_VARIABLES)}
+  script:
+    - |
+{TRIVY_DB_CHECK}
+    - trivy image $SKIP_UPDATE --severity HIGH,CRITICAL ${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:latest
+  cache:
+    key: trivy-db
+    paths:
+      - .trivycache/
+  allow_failure: true"""
+
+            if oras_image or alpine_image:
+                # Scheduled pipelines copy the upstream vulnerability DBs into Nexus; scan jobs never leave the network.
+                # The oras image from Nexus when there is one, else alpine with the oras-cli package
+                mirror_image = f"""
+  image:
+    name: {oras_image}
+    entrypoint: [""]""" if oras_image else f"""
+  image: {alpine_image}"""
+                mirror_setup = "" if oras_image else """
   before_script:
-    - apk add --no-cache curl
-    - curl -sfL https://raw.githubusercontent.com/aquasecurity/trivy/main/contrib/install.sh | sh -s -- -b /usr/local/bin
+    - apk add --no-cache oras-cli"""
+                extra_jobs.append(f"""trivy_db_mirror:
+  stage: security{mirror_image}
+  tags:
+    - docker{job_variables(TRIVY_MIRROR_VARIABLES)}{mirror_setup}
   script:
-    - export TRIVY_USERNAME="${{NEXUS_USERNAME}}"
-    - export TRIVY_PASSWORD="${{NEXUS_PASSWORD}}"
-    - trivy image --server http://trivy-server:8080 --severity HIGH,CRITICAL --insecure ${{NEXUS_REGISTRY}}/apm-repo/demo/${{IMAGE_NAME}}:latest
+    - oras copy "${{TRIVY_DB_UPSTREAM}}" "${{TRIVY_DB_REPOSITORY}}" --to-plain-http --to-username "${{NEXUS_USERNAME}}" --to-password "${{NEXUS_PASSWORD}}"
+    - oras copy "${{TRIVY_JAVA_DB_UPSTREAM}}" "${{TRIVY_JAVA_DB_REPOSITORY}}" --to-plain-http --to-username "${{NEXUS_USERNAME}}" --to-password "${{NEXUS_PASSWORD}}"
+  rules:
+    - if: '$CI_PIPELINE_SOURCE == "schedule"'
+  needs: []
   allow_failure: true""")
 
         if "push" in requested and alpine_image:
-            yaml_parts.append(f"""push_release:
+            jobs["push"] = f"""push_release:
   stage: push
   image: {alpine_image}
   tags:
@@ -252,12 +886,11 @@ class Tools:
       MANIFEST=$(curl -s -u "${{NEXUS_USERNAME}}:${{NEXUS_PASSWORD}}" -H "Accept: application/vnd.docker.distribution.manifest.v2+json" "http://${{NEXUS_REGISTRY}}/v2/apm-repo/demo/${{IMAGE_NAME}}/manifests/latest")
     - |
       curl -s -u "${{NEXUS_USERNAME}}:${{NEXUS_PASSWORD}}" -X PUT -H "Content-Type: application/vnd.docker.distribution.manifest.v2+json" -d "$MANIFEST" "http://${{NEXUS_REGISTRY}}/v2/apm-repo/demo/${{IMAGE_NAME}}/manifests/${{RELEASE_TAG}}"
-    - echo "Release tag ${{RELEASE_TAG}} created!"
-  dependencies:
-    - test_image""")
+    - echo "Release tag ${{RELEASE_TAG}} created!\\""""
 
+        digest_field = ',"image_digest":"\\'"${IMAGE_DIGEST}"\\'"' if incremental else ""
         if "notify" in requested and alpine_image:
-            yaml_parts.append(f"""notify_success:
+            jobs["notify"] = f"""notify_success:
   stage: notify
   image: {alpine_image}
   tags:
@@ -265,12 +898,71 @@ class Tools:
   script:
     - apk add --no-cache curl
     - |
-      curl -k -X POST "${{SPLUNK_HEC_URL}}/services/collector/event" -H "Authorization: Splunk ${{SPLUNK_HEC_TOKEN}}" -H "Content-Type: application/json" -d '{{"event":{{"pipeline_id":"'"${{CI_PIPELINE_ID}}"'","status":"success","project":"'"${{CI_PROJECT_NAME}}"'","branch":"'"${{CI_COMMIT_REF_NAME}}"'"}}}}'
-  when: on_success
-  allow_failure: true""")
+      curl -k -X POST "${{SPLUNK_HEC_URL}}/services/collector/event" -H "Authorization: Splunk ${{SPLUNK_HEC_TOKEN}}" -H "Content-Type: application/json" -d '{{"event":{{"pipeline_id":"'"${{CI_PIPELINE_ID}}"'","status":"success","project":"'"${{CI_PROJECT_NAME}}"'","branch":"'"${{CI_COMMIT_REF_NAME}}"'"{digest_field}}}}}'
+  allow_failure: true"""
+
+        # Job graph: artifact dependencies in stage mode, needs: edges in DAG mode
+        present = [s for s in ALL_STAGES if s in requested and s in jobs]
+        if dag:
+            edges = {s: resolve_needs(s, present) for s in present}
+        else:
+            edges = {s: [d for d in STAGE_DEPENDENCIES.get(s, []) if d in present] for s in present}
+        for stage in present:
+            upstream = [STAGE_JOBS[u] for u in edges[stage]]
+            if dag:
+                # Only pull artifacts along edges that consume them (compile output for build and analysis)
+                edge_jobs = [(STAGE_JOBS[u], u in STAGE_DEPENDENCIES.get(stage, [])) for u in edges[stage]]
+                if incremental and stage == "notify" and "build" in present:
+                    # The digest comes from build_image, or from resolve_image_digest when the build was skipped
+                    edge_jobs += [("build_image", True), ("resolve_image_digest", True)]
+                needs = "".join(
+                    f"\\n    - job: {job}\\n      artifacts: {'true' if artifacts else 'false'}{optional_need}"
+                    for job, artifacts in edge_jobs
+                )
+                jobs[stage] += "\\n  needs:" + needs if needs else "\\n  needs: []"
+            elif upstream:
+                jobs[stage] += "\\n  dependencies:" + "".join(f"\\n    - {j}" for j in upstream)
+            paths = change_paths[CHANGE_SCOPES[stage]] if incremental and stage in CHANGE_SCOPES else ()
+            jobs[stage] += job_rules(paths, full_only=split and stage not in FAST_STAGES)
+            yaml_parts.append(jobs[stage])
+
+        if incremental and "build" in present and alpine_image:
+            # No runtime change: skip the image build and hand the current image digest to downstream jobs
+            runtime_globs = "".join(f'\\n        - "{p}"' for p in change_paths["runtime"])
+            extra_jobs.append(f"""resolve_image_digest:
+  stage: build
+  image: {alpine_image}
+  tags:
+    - docker
+  script:
+    - |
+      DIGEST=$(curl -sI -u "${{NEXUS_USERNAME}}:${{NEXUS_PASSWORD}}" -H "Accept: application/vnd.docker.distribution.manifest.v2+json" "http://${{NEXUS_REGISTRY}}/v2/apm-repo/demo/${{IMAGE_NAME}}/manifests/latest" | awk 'tolower($1)=="docker-content-digest:" {{print $2}}' | tr -cd 'a-z0-9:')
+      echo "Reusing ${{IMAGE_NAME}}@${{DIGEST}}"
+      echo "IMAGE_DIGEST=${{DIGEST}}" > image.env
+  artifacts:
+    reports:
+      dotenv: image.env
+  needs: []
+  rules:{FULL_ONLY_RULE if split else ""}
+    - changes:{runtime_globs}
+      when: never
+    - when: on_success""")
+        yaml_parts.extend(extra_jobs)
+
+        if dag and present:
+            path, path_minutes = critical_path(present, edges)
+            wall_minutes = estimate_minutes(present, edges, RUNNER_CONCURRENCY)
+            stage_minutes = sum(STAGE_MINUTES.get(s, 1) for s in present)
+            yaml_parts.insert(0, f"""# DAG mode: each job starts as soon as the jobs in its needs: list finish
+# Critical path: {" -> ".join(STAGE_JOBS[s] for s in path)} (~{path_minutes} min)
+# Estimated wall clock on {RUNNER_CONCURRENCY} concurrent runners: ~{wall_minutes} min (strict stage order: ~{stage_minutes} min)""")
 
-        return "\\n\\n".join(yaml_parts)
-''').strip())
+        rendered = "\\n\\n".join(yaml_parts)
+        RENDER_CACHE[cache_key] = rendered
+        while len(RENDER_CACHE) > RENDER_CACHE_SIZE:
+            RENDER_CACHE.popitem(last=False)
+        return rendered
+''').strip()))
 
 meta = ToolMeta(description="Generate GitLab CI pipeline YAML using Nexus private registry images")
 form = ToolForm(id=TOOL_ID, name="GitLab Pipeline Generator", content=content, meta=meta, access_control=None)
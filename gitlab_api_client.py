@@ -0,0 +1,222 @@
+"""
+Shared GitLab API client for the OpenWebUI tools.
+
+Tool deploy scripts (gitlab_commit_tool.py) inline this module into the tool
+source in place of the GITLAB_CLIENT_MARKER line, so every GitLab call goes
+through the same code:
+
+- one pooled keep-alive requests.Session per GitLab URL/token, shared by all
+  tools loaded in the same OpenWebUI worker
+- idempotent calls are retried on connection errors, 429 and 502/503/504 with
+  jittered exponential backoff (Retry-After wins when GitLab sends it); other
+  calls are retried only on 429, which GitLab returns before doing any work
+- RateLimit-Remaining / RateLimit-Reset from every response throttle the next
+  calls once the remaining budget drops to RATE_LIMIT_RESERVE, spreading them
+  over the rest of the window instead of tripping the limiter
+- every call's method, path, status, duration, attempts and throttle wait is
+  recorded; track() collects the calls one tool invocation makes, on any client
+- poll() repeats a GET with a growing interval until a condition holds or a
+  deadline passes, for waiting on GitLab's asynchronous work (pipelines)
+"""
+import os, random, sys, threading, time, types
+from collections import deque
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.getenv("GITLAB_POOL_SIZE", "16"))
+MAX_RETRIES = int(os.getenv("GITLAB_MAX_RETRIES", "4"))
+REQUEST_TIMEOUT = 10
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Calls left in the rate-limit window below which requests are spread out
+RATE_LIMIT_RESERVE = int(os.getenv("GITLAB_RATE_LIMIT_RESERVE", "10"))
+TIMING_HISTORY = 200
+# poll(): first re-check after POLL_INTERVAL seconds, growing by POLL_BACKOFF up to POLL_MAX_INTERVAL
+POLL_INTERVAL = 0.25
+POLL_BACKOFF = 1.6
+POLL_MAX_INTERVAL = 2.0
+
+# Bump when the client's behaviour changes so workers do not keep an old instance
+CLIENT_VERSION = 1
+
+
+class GitLabClient:
+    def __init__(self, base_url, token, pool_size=POOL_SIZE, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update({"PRIVATE-TOKEN": token})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timings = deque(maxlen=TIMING_HISTORY)
+        self._remaining = None
+        self._reset_at = 0.0
+        self._lock = threading.Lock()
+
+    # -- rate limiting ------------------------------------------------------
+
+    def _observe(self, resp):
+        """Remember the rate-limit budget GitLab reported"""
+        try:
+            remaining = int(resp.headers["RateLimit-Remaining"])
+            reset_at = float(resp.headers["RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            self._remaining, self._reset_at = remaining, reset_at
+
+    def _throttle(self):
+        """Sleep so the remaining budget lasts until the window resets; returns seconds waited"""
+        with self._lock:
+            remaining, reset_at = self._remaining, self._reset_at
+            if remaining is None or remaining > RATE_LIMIT_RESERVE:
+                return 0.0
+            self._remaining = remaining - 1
+        delay = min((reset_at - time.time()) / max(remaining, 1), BACKOFF_MAX)
+        if delay <= 0:
+            return 0.0
+        time.sleep(delay)
+        return delay
+
+    def _retry_delay(self, attempt, resp):
+        """Retry-After when given, otherwise full-jitter exponential backoff"""
+        if resp is not None and resp.headers.get("Retry-After", "").isdigit():
+            return min(float(resp.headers["Retry-After"]), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _record(self, entry):
+        self.timings.append(entry)
+        for calls in getattr(_shared_state().local, "trackers", []):
+            calls.append(entry)
+
+    # -- HTTP ---------------------------------------------------------------
+
+    def request(self, method, path, retry=None, timeout=REQUEST_TIMEOUT, **kwargs):
+        """One API call; `path` is relative to /api/v4.
+
+        `retry` defaults to True for idempotent methods. The final response is
+        returned whatever its status; connection errors are re-raised once the
+        retries are used up.
+        """
+        method = method.upper()
+        retry = method in IDEMPOTENT_METHODS if retry is None else retry
+        url = f"{self.base_url}/api/v4/{path.lstrip('/')}"
+        started = time.monotonic()
+        throttled = 0.0
+        attempt = 0
+        while True:
+            throttled += self._throttle()
+            resp, error = None, None
+            try:
+                resp = self.session.request(method, url, timeout=timeout, **kwargs)
+                self._observe(resp)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            retryable = (resp.status_code == 429 or (retry and resp.status_code in RETRY_STATUSES)
+                         if resp is not None else retry)
+            if not retryable or attempt >= self.max_retries:
+                break
+            time.sleep(self._retry_delay(attempt, resp))
+            attempt += 1
+        self._record({
+            "method": method,
+            "path": path,
+            "status": resp.status_code if resp is not None else None,
+            "seconds": round(time.monotonic() - started, 3),
+            "attempts": attempt + 1,
+            "throttled": round(throttled, 3),
+        })
+        if error is not None:
+            raise error
+        return resp
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def poll(self, path, ready, deadline, **kwargs):
+        """GET `path` until ready(resp) is true; None when `deadline` seconds pass first.
+
+        The first check is immediate, later ones back off from POLL_INTERVAL
+        to POLL_MAX_INTERVAL, so fast results return fast and slow ones do not
+        hammer the API.
+        """
+        stop = time.monotonic() + deadline
+        interval = POLL_INTERVAL
+        while True:
+            resp = self.get(path, **kwargs)
+            if ready(resp):
+                return resp
+            remaining = stop - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+
+def _shared_state():
+    """Process-wide state shared by every tool module that embeds this client"""
+    shared = sys.modules.get("_gitlab_api_shared")
+    if shared is None:
+        candidate = types.ModuleType("_gitlab_api_shared")
+        candidate.clients = {}
+        candidate.lock = threading.Lock()
+        candidate.local = threading.local()
+        shared = sys.modules.setdefault("_gitlab_api_shared", candidate)
+    return shared
+
+
+@contextmanager
+def track():
+    """Collect the timing entries of calls this thread makes inside the block"""
+    calls = []
+    trackers = _shared_state().local.__dict__.setdefault("trackers", [])
+    trackers.append(calls)
+    try:
+        yield calls
+    finally:
+        trackers.remove(calls)
+
+
+def summarize_timings(calls):
+    """One-line summary of tracked calls: count, total time, retries, throttle wait"""
+    total = sum(c["seconds"] for c in calls)
+    retries = sum(c["attempts"] - 1 for c in calls)
+    throttled = sum(c["throttled"] for c in calls)
+    slowest = max(calls, key=lambda c: c["seconds"], default=None)
+    summary = f"{len(calls)} calls in {total:.2f}s, {retries} retries, {throttled:.1f}s throttled"
+    if slowest:
+        summary += f", slowest {slowest['method']} {slowest['path'].split('?')[0]} {slowest['seconds']:.2f}s"
+    return summary
+
+
+def get_gitlab_client(base_url, token):
+    """Process-wide GitLabClient shared by every tool module in this worker"""
+    shared = _shared_state()
+    key = (CLIENT_VERSION, base_url.rstrip("/"), token)
+    with shared.lock:
+        client = shared.clients.get(key)
+        if client is None:
+            client = shared.clients[key] = GitLabClient(base_url, token)
+    return client
+
+
+# --- deploy helpers (not embedded into tool sources) ---
+
+GITLAB_CLIENT_MARKER = "# <gitlab_api_client>"
+
+
+def embed_gitlab_client(tool_source):
+    """Replace GITLAB_CLIENT_MARKER in a tool source with this module's code"""
+    from pathlib import Path
+    source = Path(__file__).read_text(encoding="utf-8")
+    client_code = source.split("# --- deploy helpers", 1)[0].rstrip() + "\n"
+    if GITLAB_CLIENT_MARKER not in tool_source:
+        raise ValueError(f"Tool source has no '{GITLAB_CLIENT_MARKER}' line")
+    return tool_source.replace(GITLAB_CLIENT_MARKER, client_code, 1)
@@ -4,11 +4,12 @@ from open_webui.utils.plugin import load_tool_module_by_id, replace_imports
 from open_webui.utils.tools import get_tool_specs
 from open_webui.config import CACHE_DIR
 from pathlib import Path
+from gitlab_api_client import embed_gitlab_client
 
 USER_ID = "1cc1b6fb-b86f-42fd-a51a-dfb70a7a0728"
 TOOL_ID = "gitlab_commit_deploy"
 
-content = replace_imports(textwrap.dedent('''
+content = replace_imports(embed_gitlab_client(textwrap.dedent('''
 """
 description: Commit Dockerfile and .gitlab-ci.yml to GitLab and trigger pipeline
 """
@@ -16,14 +17,11 @@ import os, requests, json, time
 from pydantic import BaseModel, Field
 from urllib.parse import urlparse
 
+# <gitlab_api_client>
 
-def _gitlab_headers(token):
-    return {"PRIVATE-TOKEN": token, "Content-Type": "application/json"}
 
-
-def _gitlab_get_project(base_url, token, project_name):
-    url = f"{base_url}/api/v4/projects"
-    resp = requests.get(url, headers=_gitlab_headers(token), params={"search": project_name}, timeout=10)
+def _gitlab_get_project(client, project_name):
+    resp = client.get("projects", params={"search": project_name})
     if resp.status_code == 200:
         for p in resp.json():
             if p["name"] == project_name or p["path"] == project_name:
@@ -31,23 +29,21 @@ def _gitlab_get_project(base_url, token, project_name):
     return None
 
 
-def _gitlab_create_project(base_url, token, project_name, branch):
-    url = f"{base_url}/api/v4/projects"
+def _gitlab_create_project(client, project_name, branch):
     data = {
         "name": project_name,
         "visibility": "internal",
         "initialize_with_readme": True,
         "default_branch": branch
     }
-    resp = requests.post(url, headers=_gitlab_headers(token), json=data, timeout=15)
+    resp = client.post("projects", json=data, timeout=15)
     resp.raise_for_status()
     return resp.json()
 
 
-def _gitlab_get_project_by_path(base_url, token, project_path):
+def _gitlab_get_project_by_path(client, project_path):
     encoded_path = requests.utils.quote(project_path.strip('/'), safe='')
-    url = f"{base_url}/api/v4/projects/{encoded_path}"
-    resp = requests.get(url, headers=_gitlab_headers(token), timeout=10)
+    resp = client.get(f"projects/{encoded_path}")
     if resp.status_code == 200:
         return resp.json()
     return None
@@ -83,6 +79,10 @@ class Tools:
             default="main",
             description="Default branch name for new repositories"
         )
+        PIPELINE_WAIT_SECONDS: int = Field(
+            default=15,
+            description="How long to wait for GitLab to create the commit's pipeline before returning without it"
+        )
 
     def __init__(self):
         self.valves = self.Valves()
@@ -95,11 +95,19 @@ class Tools:
         gitlab_ci_content: The full .gitlab-ci.yml content to commit
         commit_message: Commit message (optional, defaults to 'Add Dockerfile and .gitlab-ci.yml')
         Returns the repository URL and pipeline URL."""
+        with track() as calls:
+            result = self._commit_and_deploy(project_name, dockerfile_content, gitlab_ci_content, commit_message, repo_url)
+        # Errors keep their exact "ERROR: ..." text for callers that match on it
+        if result.startswith("ERROR") or not calls:
+            return result
+        return f"{result}\\n- GitLab API: {summarize_timings(calls)}"
+
+    def _commit_and_deploy(self, project_name, dockerfile_content, gitlab_ci_content, commit_message, repo_url):
         try:
             base_url = self.valves.GITLAB_URL.rstrip('/')
             token = self.valves.GITLAB_TOKEN
+            client = get_gitlab_client(base_url, token)
             branch = self.valves.DEFAULT_BRANCH
-            headers = _gitlab_headers(token)
 
             repo_url = (repo_url or "").strip()
             project_name = (project_name or "").strip()
@@ -112,30 +120,33 @@ class Tools:
                     base_url, project_path = _parse_repo_url(repo_url)
                 except ValueError as ve:
                     return f"ERROR: {ve}"
-                project = _gitlab_get_project_by_path(base_url, token, project_path)
+                client = get_gitlab_client(base_url, token)
+                project = _gitlab_get_project_by_path(client, project_path)
                 if not project:
                     return f"ERROR: Repository not found or access denied: {repo_url}"
                 project_id = project["id"]
                 project_url = project["web_url"]
                 status_msg = f"Using provided repository: {project_url}"
             else:
-                project = _gitlab_get_project(base_url, token, project_name)
+                project = _gitlab_get_project(client, project_name)
                 if project:
                     project_id = project["id"]
                     project_url = project["web_url"]
                     status_msg = f"Using existing project: {project_name}"
                 else:
-                    project = _gitlab_create_project(base_url, token, project_name, branch)
+                    project = _gitlab_create_project(client, project_name, branch)
                     project_id = project["id"]
                     project_url = project["web_url"]
                     status_msg = f"Created new project: {project_name}"
-                    time.sleep(2)
+                    # The README commit lands asynchronously; commit once the branch exists
+                    branch_path = f"projects/{project_id}/repository/branches/{requests.utils.quote(branch, safe='')}"
+                    client.poll(branch_path, lambda r: r.status_code == 200, deadline=10)
 
             # Step 2: Build commit actions (create or update files)
             actions = []
             for file_path, file_content in [("Dockerfile", dockerfile_content), (".gitlab-ci.yml", gitlab_ci_content)]:
-                check_url = f"{base_url}/api/v4/projects/{project_id}/repository/files/{requests.utils.quote(file_path, safe='')}"
-                check_resp = requests.get(check_url, headers=headers, params={"ref": branch}, timeout=10)
+                check_path = f"projects/{project_id}/repository/files/{requests.utils.quote(file_path, safe='')}"
+                check_resp = client.request("HEAD", check_path, params={"ref": branch})
                 action = "update" if check_resp.status_code == 200 else "create"
                 actions.append({
                     "action": action,
@@ -144,27 +155,29 @@ class Tools:
                 })
 
             # Step 3: Create commit with all files
-            commit_url = f"{base_url}/api/v4/projects/{project_id}/repository/commits"
             commit_data = {
                 "branch": branch,
                 "commit_message": commit_message,
                 "actions": actions
             }
-            commit_resp = requests.post(commit_url, headers=headers, json=commit_data, timeout=15)
+            commit_resp = client.post(f"projects/{project_id}/repository/commits", json=commit_data, timeout=15)
             commit_resp.raise_for_status()
             commit_info = commit_resp.json()
             commit_sha = commit_info.get("id", "unknown")[:8]
 
-            # Step 4: Wait briefly and get pipeline status
-            time.sleep(3)
-            pipeline_url_api = f"{base_url}/api/v4/projects/{project_id}/pipelines"
-            pipe_resp = requests.get(pipeline_url_api, headers=headers, params={"per_page": 1, "order_by": "id", "sort": "desc"}, timeout=10)
-            pipeline_info = ""
-            if pipe_resp.status_code == 200 and pipe_resp.json():
+            # Step 4: Wait for this commit's pipeline, not whichever pipeline is newest in the project
+            wait = self.valves.PIPELINE_WAIT_SECONDS
+            pipe_resp = client.poll(
+                f"projects/{project_id}/pipelines",
+                lambda r: r.status_code == 200 and bool(r.json()),
+                deadline=wait,
+                params={"sha": commit_info.get("id", ""), "per_page": 1, "order_by": "id", "sort": "desc"}
+            )
+            if pipe_resp is not None:
                 pipeline = pipe_resp.json()[0]
                 pipeline_info = f"\\n- Pipeline #{pipeline['id']}: {pipeline['status']}\\n- Pipeline URL: {pipeline['web_url']}"
             else:
-                pipeline_info = "\\n- Pipeline: triggered (check GitLab for status)"
+                pipeline_info = f"\\n- Pipeline: none created for {commit_sha} within {wait}s (check GitLab for status)"
 
             return (
                 f"## Deployment Successful!\\n\\n"
@@ -176,8 +189,8 @@ class Tools:
             )
 
         except requests.exceptions.HTTPError as e:
-            error_detail = e.response.text if e.response else str(e)
-            return f"ERROR: GitLab API error: {e.response.status_code if e.response else 'unknown'} - {error_detail}"
+            error_detail = e.response.text if e.response is not None else str(e)
+            return f"ERROR: GitLab API error: {e.response.status_code if e.response is not None else 'unknown'} - {error_detail}"
         except requests.exceptions.ConnectionError:
             return f"ERROR: Cannot connect to GitLab at {base_url}. Ensure the server is running."
         except Exception as e:
@@ -187,9 +200,8 @@ class Tools:
         """List all available GitLab projects.
         Returns a list of project names and their URLs."""
         try:
-            headers = _gitlab_headers(self.valves.GITLAB_TOKEN)
-            url = f"{self.valves.GITLAB_URL}/api/v4/projects"
-            resp = requests.get(url, headers=headers, params={"per_page": 50, "order_by": "updated_at"}, timeout=10)
+            client = get_gitlab_client(self.valves.GITLAB_URL.rstrip('/'), self.valves.GITLAB_TOKEN)
+            resp = client.get("projects", params={"per_page": 50, "order_by": "updated_at"})
             resp.raise_for_status()
             projects = resp.json()
             if not projects:
@@ -200,7 +212,7 @@ class Tools:
             return "\\n".join(lines)
         except Exception as e:
             return f"ERROR listing projects: {str(e)}"
-''').strip())
+''').strip()))
 
 meta = ToolMeta(description="Commit Dockerfile and .gitlab-ci.yml to GitLab and trigger CI/CD pipeline automatically")
 form = ToolForm(id=TOOL_ID, name="GitLab Commit & Deploy", content=content, meta=meta, access_control=None)
@@ -0,0 +1,654 @@
+"""
+Shared Nexus registry client for the OpenWebUI tools.
+
+The tool deploy scripts (fix_docker_tool.py, create_image_versions_tool.py,
+fix_pipeline_sonar.py, ...) inline this module into the tool source in place
+of the REGISTRY_CLIENT_MARKER line, so every tool talks to Nexus through the
+same code:
+
+- one pooled keep-alive requests.Session per registry/user
+- TTL cache for the catalog, per-repository tag lists and image manifest
+  metadata; entries past their TTL are served stale while a background refresh runs (stale-while-revalidate)
+- concurrent identical fetches are coalesced into a single HTTP request
+- a persistent SQLite (WAL) cache under the OpenWebUI CACHE_DIR, shared by
+  every worker process, so a restarted worker starts warm
+
+The client instance is stored process-wide, so all tools loaded in the same
+OpenWebUI worker share one connection pool and one in-memory cache.
+"""
+import heapq, json, os, re, sqlite3, sys, threading, time, types
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+REGISTRY = os.getenv("NEXUS_REGISTRY", "http://ai-nexus:5001").rstrip("/")
+USER = os.getenv("NEXUS_USER", "admin")
+PASS = os.getenv("NEXUS_PASS", "r")
+PULL_REGISTRY = "localhost:5001"
+
+CACHE_TTL = float(os.getenv("NEXUS_CACHE_TTL", "300"))
+CACHE_STALE_TTL = float(os.getenv("NEXUS_CACHE_STALE_TTL", "3600"))
+POOL_SIZE = int(os.getenv("NEXUS_POOL_SIZE", "16"))
+FETCH_WORKERS = int(os.getenv("NEXUS_FETCH_WORKERS", "8"))
+REQUEST_TIMEOUT = 10
+# Seconds one worker holds the right to revalidate an entry before others may retry
+REVALIDATE_LEASE = 30
+
+MANIFEST_ACCEPT = ", ".join([
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.oci.image.index.v1+json",
+])
+
+# Bump whenever RegistryClient gains or changes methods or its cached data layout changes:
+# a redeployed tool in a running worker otherwise gets the old instance and hits AttributeError
+CLIENT_VERSION = 6
+
+# Helper image roles: (substrings that qualify a repository, substrings that exclude it)
+IMAGE_ROLES = {
+    "alpine": (["alpine"], ["curl"]),
+    "jre": (["eclipse-temurin", "amazoncorretto"], []),
+    "builder": (["maven", "gradle", "golang", "rust", "kaniko"], []),
+    "runtime": (["python", "node", "ruby", "php", "nginx", "dotnet"], []),
+}
+
+# Repositories that hold build artifacts rather than base images: Kaniko layer
+# caches and the Trivy vulnerability DBs. Never offered as an image for a stage or role
+NON_IMAGE_REPO_PREFIXES = ("apm-repo/cache/", "apm-repo/trivy-db", "apm-repo/trivy-java-db")
+
+# Roles that end up in a final image stage are resolved to their smallest image
+# by compressed pull size; tags containing one of these substrings win (a JRE over a JDK)
+RUNTIME_ROLE_TAGS = {
+    "alpine": (),
+    "jre": ("jre",),
+    "runtime": ("slim", "alpine"),
+}
+SIZE_CANDIDATES = 4
+
+# Technology / synonym -> image keyword. Used by the pipeline tool to pick
+# images and by repository search to expand query words ("go" -> "golang").
+IMAGE_MAP = {
+    "java": "maven",
+    "python": "python",
+    "node": "node",
+    "golang": "golang",
+    "go": "golang",
+    "php": "php",
+    "dotnet": "dotnet",
+    "aspnet": "dotnet",
+    "rust": "rust",
+    "sonarqube": "sonar-scanner",
+    "sonar": "sonar-scanner",
+    "quality": "sonar-scanner",
+    "nginx": "nginx",
+    "redis": "redis",
+    "mongo": "mongo",
+    "postgres": "postgres",
+    "maven": "maven",
+    "alpine": "alpine",
+    "ruby": "ruby",
+    "gradle": "gradle"
+}
+
+SEARCH_LIMIT = 25
+TOKEN_SPLIT_RE = re.compile(r"[/\-_.:\s,]+")
+TAG_VERSION_RE = re.compile(r"v?(\d+(?:\.\d+)*)(.*)")
+
+
+def sort_tags(tags):
+    """Newest first by semantic version ("3.12" > "3.12-slim" > "3.11"); unversioned tags (latest, debug) last"""
+    def version_key(tag):
+        match = TAG_VERSION_RE.match(tag)
+        if not match:
+            return (0, (), 0, tag)
+        numbers = tuple(int(p) for p in match.group(1).split("."))
+        return (1, numbers, -len(match.group(2)), tag)
+    return sorted(tags, key=version_key, reverse=True)
+
+
+def newest_version(tags):
+    """Tags sharing the newest version number ("3.12", "3.12-slim"), newest first; all tags when none is versioned"""
+    ordered = sort_tags(tags)
+    versions = [TAG_VERSION_RE.match(tag) for tag in ordered]
+    if not versions or not versions[0]:
+        return ordered
+    return [tag for tag, match in zip(ordered, versions) if match and match.group(1) == versions[0].group(1)]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token) used for output budgets"""
+    return len(text) // 4 + 1
+
+
+def _trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent transpositions count as 1), capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class RepositoryIndex:
+    """Inverted token and trigram index over repository paths for ranked fuzzy search.
+
+    Query words are matched against path tokens ("apm-repo/demo/eclipse-temurin"
+    -> apm, repo, demo, eclipse, temurin) by exact token, substring, then typo
+    tolerance (edit distance via trigram candidates), and expanded through
+    IMAGE_MAP synonyms. Words of two characters or less only match whole
+    tokens so "go" does not flood results with "mongo" or "golang-*".
+    """
+
+    EXACT, PARTIAL, FUZZY, SYNONYM_FACTOR, NAME_BONUS = 3.0, 2.0, 1.5, 0.8, 0.5
+
+    def __init__(self, repos):
+        # Repository ids are assigned in tie-break order (shorter path first),
+        # so ranking within equal scores is a plain integer sort
+        self.repos = sorted(set(repos), key=lambda r: (len(r), r))
+        self.token_repos = {}
+        self.token_name_repos = {}
+        for i, repo in enumerate(self.repos):
+            lowered = repo.lower()
+            name_tokens = set(t for t in TOKEN_SPLIT_RE.split(lowered.rsplit("/", 1)[-1]) if t)
+            for token in set(t for t in TOKEN_SPLIT_RE.split(lowered) if t):
+                self.token_repos.setdefault(token, set()).add(i)
+                if token in name_tokens:
+                    self.token_name_repos.setdefault(token, set()).add(i)
+        self.trigram_tokens = {}
+        for token in self.token_repos:
+            for gram in _trigrams(token):
+                self.trigram_tokens.setdefault(gram, set()).add(token)
+        self.synonyms = {}
+        for alias, keyword in IMAGE_MAP.items():
+            self.synonyms.setdefault(alias, set()).add(keyword)
+            self.synonyms.setdefault(keyword, set()).add(alias)
+
+    def _match_tokens(self, word):
+        """{token: weight} for one query word"""
+        matches = {}
+        if word in self.token_repos:
+            matches[word] = self.EXACT
+        if len(word) <= 2:
+            return matches
+        grams = _trigrams(word)
+        shared = {}
+        for gram in grams:
+            for token in self.trigram_tokens.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        limit = 1 if len(word) <= 5 else 2
+        for token, count in shared.items():
+            if token in matches:
+                continue
+            if word in token:
+                matches[token] = self.PARTIAL
+            elif count * 3 >= len(grams):
+                distance = _edit_distance(word, token, limit)
+                if distance <= limit:
+                    matches[token] = self.FUZZY - 0.25 * distance
+        return matches
+
+    def _score_word(self, word):
+        """{repo id: best score} for one query word including synonym expansion"""
+        weighted = []
+        expansions = [(word, 1.0)] + [(s, self.SYNONYM_FACTOR) for s in self.synonyms.get(word, ()) if s != word]
+        for term, factor in expansions:
+            for part in [p for p in TOKEN_SPLIT_RE.split(term) if p]:
+                for token, weight in self._match_tokens(part).items():
+                    name_repos = self.token_name_repos.get(token, set())
+                    weighted.append(((weight + self.NAME_BONUS) * factor, name_repos))
+                    weighted.append((weight * factor, self.token_repos[token] - name_repos))
+        # Highest weight first: each repo keeps the first (best) score it gets
+        best = {}
+        for score, repo_ids in sorted(weighted, key=lambda w: -w[0]):
+            fresh = repo_ids.difference(best)
+            if fresh:
+                best.update(dict.fromkeys(fresh, score))
+        return best
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Ranked repositories for a free-text query (best first); limit=None returns every match"""
+        limit = limit or len(self.repos)
+        words = [w for w in TOKEN_SPLIT_RE.split(query.lower()) if len(w) > 1]
+        scores = {}
+        for word in dict.fromkeys(words):
+            word_scores = self._score_word(word)
+            if not scores:
+                scores = word_scores
+                continue
+            for i, score in word_scores.items():
+                scores[i] = scores.get(i, 0.0) + score
+        buckets = {}
+        for i, score in scores.items():
+            buckets.setdefault(score, []).append(i)
+        ranked = []
+        for score in sorted(buckets, reverse=True):
+            ranked.extend(heapq.nsmallest(limit - len(ranked), buckets[score]))
+            if len(ranked) >= limit:
+                break
+        return [self.repos[i] for i in ranked]
+
+
+def default_cache_path():
+    """NEXUS_CACHE_PATH, else the shared registry cache under OpenWebUI's CACHE_DIR, else None"""
+    if os.getenv("NEXUS_CACHE_PATH"):
+        return os.getenv("NEXUS_CACHE_PATH")
+    try:
+        from open_webui.config import CACHE_DIR
+    except Exception:
+        return None
+    return str(CACHE_DIR / "tools" / "nexus_registry" / "registry.sqlite3")
+
+
+class DiskCache:
+    """Cross-process key/value cache in SQLite WAL mode with per-entry freshness.
+
+    Writers never overwrite a newer entry, and revalidation leases let one
+    process refresh an entry while the others keep serving it.
+    """
+
+    def __init__(self, path, namespace=""):
+        self.path = path
+        self.namespace = namespace
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, key):
+        return "\x1f".join((self.namespace,) + tuple(key))
+
+    def get(self, key):
+        """(value, fetched_at) or None"""
+        row = self._connect().execute(
+            "SELECT value, fetched_at FROM entries WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, key, value, fetched_at):
+        self._connect().execute(
+            "INSERT INTO entries (key, value, fetched_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, fetched_at = excluded.fetched_at, lease_until = 0 "
+            "WHERE excluded.fetched_at > entries.fetched_at",
+            (self._key(key), json.dumps(value), fetched_at)
+        )
+
+    def claim(self, key, now):
+        """True if this process may revalidate key (no other live lease)"""
+        cursor = self._connect().execute(
+            "UPDATE entries SET lease_until = ? WHERE key = ? AND lease_until < ?",
+            (now + REVALIDATE_LEASE, self._key(key), now)
+        )
+        return cursor.rowcount > 0
+
+    def clear(self, key=None):
+        if key is None:
+            self._connect().execute("DELETE FROM entries WHERE key LIKE ?", (self.namespace + "\x1f%",))
+        else:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RegistryClient:
+    def __init__(self, registry=REGISTRY, user=USER, password=PASS,
+                 ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, pool_size=POOL_SIZE, cache_path=None):
+        self.registry = registry.rstrip("/")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.version = 0
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nexus-revalidate")
+        self._workers = ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, pool_size), thread_name_prefix="nexus-fetch")
+        self._image_catalog = (None, [])
+        self._role_index = (None, {})
+        self._repo_index = (None, None)
+        self.disk = None
+        cache_path = cache_path or default_cache_path()
+        if cache_path:
+            try:
+                self.disk = DiskCache(cache_path, namespace=self.registry)
+            except Exception:
+                self.disk = None  # read-only or missing CACHE_DIR: memory cache only
+
+    # -- HTTP ---------------------------------------------------------------
+
+    def _get_json(self, path, params=None):
+        resp = self.session.get(f"{self.registry}{path}", params=params, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return resp
+
+    def _fetch_catalog(self):
+        repos = []
+        params = {"n": 1000}
+        path = "/v2/_catalog"
+        while path:
+            resp = self._get_json(path, params)
+            repos.extend(resp.json().get("repositories") or [])
+            next_link = resp.links.get("next", {}).get("url")
+            path = next_link.replace(self.registry, "") if next_link else None
+            params = None
+        return repos
+
+    def _fetch_tags(self, repo):
+        return self._get_json(f"/v2/{repo}/tags/list").json().get("tags") or []
+
+    def _fetch_manifest(self, repo, tag):
+        """Digest, media type, layer count and compressed pull size of repo:tag (linux/amd64 for multi-arch)"""
+        resp = self.session.get(f"{self.registry}/v2/{repo}/manifests/{tag}",
+                                headers={"Accept": MANIFEST_ACCEPT}, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.json()
+        digest = resp.headers.get("Docker-Content-Digest")
+        if data.get("manifests"):
+            platforms = data["manifests"]
+            chosen = next((m for m in platforms if m.get("platform", {}).get("os") == "linux"
+                           and m.get("platform", {}).get("architecture") == "amd64"), platforms[0])
+            resp = self.session.get(f"{self.registry}/v2/{repo}/manifests/{chosen['digest']}",
+                                    headers={"Accept": MANIFEST_ACCEPT}, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            data = resp.json()
+        layers = data.get("layers") or []
+        return {
+            "digest": digest,
+            "media_type": data.get("mediaType") or resp.headers.get("Content-Type", ""),
+            "layers": len(layers),
+            "compressed_size": sum(l.get("size", 0) for l in layers) + (data.get("config") or {}).get("size", 0)
+        }
+
+    # -- cache --------------------------------------------------------------
+
+    def _remember(self, key, value, fetched_at):
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous[1] >= fetched_at:
+                return previous
+            if previous is None or previous[0] != value:
+                self.version += 1
+            self._entries[key] = (value, fetched_at)
+            return self._entries[key]
+
+    def _store(self, key, value):
+        fetched_at = time.time()
+        self._remember(key, value, fetched_at)
+        if self.disk is not None:
+            try:
+                self._disk_call(self.disk.put, key, value, fetched_at)
+            except Exception:
+                pass
+
+    def _disk_call(self, method, *args):
+        """Disk cache access; a broken cache file degrades to memory-only"""
+        try:
+            return method(*args)
+        except sqlite3.DatabaseError:
+            self.disk = None
+            raise
+
+    def _fetch(self, key, loader):
+        """Run loader once per key no matter how many threads ask concurrently"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self._store(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _revalidate(self, key, loader):
+        with self._lock:
+            if key in self._inflight:
+                return
+        if self.disk is not None:
+            try:
+                if not self._disk_call(self.disk.claim, key, time.time()):
+                    return  # another worker is already refreshing this entry
+            except Exception:
+                pass
+        def run():
+            try:
+                self._fetch(key, loader)
+            except Exception:
+                pass  # keep serving the stale entry; the next call retries
+        self._background.submit(run)
+
+    def _cached(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+        now = time.time()
+        if (entry is None or now - entry[1] >= self.ttl) and self.disk is not None:
+            # Another worker (or a previous process) may hold a fresher copy
+            try:
+                stored = self._disk_call(self.disk.get, key)
+            except Exception:
+                stored = None
+            if stored is not None:
+                entry = self._remember(key, *stored)
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._revalidate(key, loader)
+                return value
+        return self._fetch(key, loader)
+
+    def invalidate(self, repo=None):
+        """Drop cached data for one repository, or everything (memory and disk)"""
+        with self._lock:
+            if repo is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(("tags", repo), None)
+        if self.disk is not None:
+            try:
+                self._disk_call(self.disk.clear, None if repo is None else ("tags", repo))
+            except Exception:
+                pass
+
+    # -- public API ---------------------------------------------------------
+
+    def catalog(self):
+        """All repository names in the registry"""
+        return self._cached(("catalog",), self._fetch_catalog)
+
+    def image_catalog(self):
+        """Catalog without NON_IMAGE_REPO_PREFIXES repositories, rebuilt only when the catalog changes"""
+        repos = self.catalog()
+        built_for, images = self._image_catalog
+        if built_for is not repos:
+            images = [repo for repo in repos if not repo.lower().startswith(NON_IMAGE_REPO_PREFIXES)]
+            self._image_catalog = (repos, images)
+        return images
+
+    def tags(self, repo):
+        """All tags of one repository"""
+        return self._cached(("tags", repo), lambda: self._fetch_tags(repo))
+
+    def manifest(self, repo, tag):
+        """Manifest metadata of one image (see _fetch_manifest)"""
+        return self._cached(("manifest", repo, tag), lambda: self._fetch_manifest(repo, tag))
+
+    def tags_many(self, repos, optional=()):
+        """Tag lists for several repositories, fetched in parallel on a bounded pool.
+
+        Returns {repo: tags} in the order given. Failures for repositories in
+        `optional` map to [] instead of raising.
+        """
+        repos = list(dict.fromkeys(repos))
+        futures = {repo: self._workers.submit(self.tags, repo) for repo in repos}
+        results = {}
+        for repo, future in futures.items():
+            try:
+                results[repo] = future.result()
+            except Exception:
+                if repo not in optional:
+                    raise
+                results[repo] = []
+        return results
+
+    def role_index(self):
+        """Repositories grouped by helper role, rebuilt only when the catalog changes"""
+        repos = self.image_catalog()
+        built_for, index = self._role_index
+        if built_for is not repos:
+            index = {role: [] for role in IMAGE_ROLES}
+            for repo in repos:
+                name = repo.lower()
+                for role, (include, exclude) in IMAGE_ROLES.items():
+                    if any(k in name for k in include) and not any(k in name for k in exclude):
+                        index[role].append(repo)
+            self._role_index = (repos, index)
+        return index
+
+    def repo_index(self):
+        """RepositoryIndex over the image repositories, rebuilt only when the catalog changes"""
+        repos = self.image_catalog()
+        built_for, index = self._repo_index
+        if built_for is not repos:
+            index = RepositoryIndex(repos)
+            self._repo_index = (repos, index)
+        return index
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Top-`limit` repositories for a query (None for all matches); every image repository when query is empty"""
+        if not query.strip():
+            return list(self.image_catalog())
+        return self.repo_index().search(query, limit)
+
+    def resolve_roles(self, roles, extra_repos=(), candidates=3):
+        """Resolve helper roles to image references in one parallel tag fetch.
+
+        Up to `candidates` repositories per role are fetched together with
+        `extra_repos`. Runtime roles (RUNTIME_ROLE_TAGS) resolve to the
+        smallest image across candidates, other roles to the newest tag of the
+        first candidate with tags. Returns ({role: "repo:tag" or None}, {repo: tags}).
+        """
+        index = self.role_index()
+        wanted = {role: index.get(role, [])[:candidates] for role in roles}
+        helper_repos = {repo for repos in wanted.values() for repo in repos} - set(extra_repos)
+        tag_map = self.tags_many(list(extra_repos) + sorted(helper_repos), optional=helper_repos)
+        resolved = {}
+        for role, repos in wanted.items():
+            available = [repo for repo in repos if tag_map.get(repo)]
+            if role in RUNTIME_ROLE_TAGS and available:
+                resolved[role] = self.smallest_image(available, tag_map, RUNTIME_ROLE_TAGS[role])
+            else:
+                resolved[role] = next((f"{repo}:{sort_tags(tag_map[repo])[0]}" for repo in available), None)
+        return resolved, tag_map
+
+    def image_size(self, repo, tag):
+        """Compressed pull size in bytes of one image, None when its manifest cannot be read"""
+        try:
+            return self.manifest(repo, tag)["compressed_size"]
+        except Exception:
+            return None
+
+    def smallest_image(self, repos, tag_map, prefer=()):
+        """Smallest "repo:tag" by compressed pull size among each repository's newest version.
+
+        Tags containing one of `prefer` beat the others regardless of size; only
+        the newest version of a repository is compared so a smaller but older
+        release never wins. Manifests are fetched in parallel and cached.
+        """
+        candidates = []
+        for repo in repos:
+            tags = newest_version(tag_map[repo])
+            preferred = [tag for tag in tags if any(p in tag for p in prefer)]
+            candidates += [(0 if preferred else 1, repo, tag) for tag in (preferred or tags)[:SIZE_CANDIDATES]]
+        futures = [self._workers.submit(self.image_size, repo, tag) for _, repo, tag in candidates]
+        sizes = [future.result() for future in futures]
+        best = min(range(len(candidates)),
+                   key=lambda i: (candidates[i][0], sizes[i] is None, sizes[i] or 0))
+        _, repo, tag = candidates[best]
+        return f"{repo}:{tag}"
+
+
+def get_client(registry=REGISTRY, user=USER, password=PASS):
+    """Process-wide RegistryClient shared by every tool module in this worker"""
+    shared = sys.modules.get("_nexus_registry_shared")
+    if shared is None:
+        candidate = types.ModuleType("_nexus_registry_shared")
+        candidate.clients = {}
+        candidate.lock = threading.Lock()
+        shared = sys.modules.setdefault("_nexus_registry_shared", candidate)
+    key = (CLIENT_VERSION, registry.rstrip("/"), user)
+    with shared.lock:
+        client = shared.clients.get(key)
+        if client is None:
+            client = shared.clients[key] = RegistryClient(registry, user, password)
+    return client
+
+
+# --- deploy helpers (not embedded into tool sources) ---
+
+REGISTRY_CLIENT_MARKER = "# <nexus_registry_client>"
+
+
+def embed_registry_client(tool_source):
+    """Replace REGISTRY_CLIENT_MARKER in a tool source with this module's code"""
+    from pathlib import Path
+    source = Path(__file__).read_text(encoding="utf-8")
+    client_code = source.split("# --- deploy helpers", 1)[0].rstrip() + "\n"
+    if REGISTRY_CLIENT_MARKER not in tool_source:
+        raise ValueError(f"Tool source has no '{REGISTRY_CLIENT_MARKER}' line")
+    return tool_source.replace(REGISTRY_CLIENT_MARKER, client_code, 1)
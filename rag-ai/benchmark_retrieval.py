@@ -0,0 +1,257 @@
+"""
+Retrieval benchmark for ChromaDB collection/HNSW settings.
+
+Loads a synthetic template corpus of configurable size into a local
+(persistent, temp-dir) ChromaDB collection for every combination of HNSW
+and distance settings, replays a labelled query set and reports p50/p95/p99
+query latency, recall@k against the labelled template, ANN recall@k against
+exact brute-force search, build time and memory/disk footprint.
+
+Embeddings are deterministic feature-hashed vectors, so the benchmark runs
+offline and measures the index rather than the embedding model.
+
+Usage:
+    python rag-ai/benchmark_retrieval.py --sizes 1000,10000 --queries 200
+    python rag-ai/benchmark_retrieval.py --sizes 100000 --write-profile rag-ai/index_profile.json
+
+The written profile is read by create_collections.py.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+from rag_collections import COLLECTIONS
+
+DEFAULT_PROFILE = Path(__file__).parent / "index_profile.json"
+
+# Vocabulary used to synthesize template-like documents
+STACKS = ["java", "python", "node", "golang", "php", "dotnet", "rust", "ruby", "gradle"]
+FRAMEWORKS = ["spring", "fastapi", "flask", "django", "express", "nestjs", "gin", "laravel",
+              "aspnet", "actix", "rails", "quarkus", "micronaut", "koa", "echo", "symfony"]
+TOOLS = ["maven", "gradle", "pip", "poetry", "npm", "yarn", "pnpm", "cargo", "composer",
+         "bundler", "nuget", "kaniko", "trivy", "sonar", "spotbugs", "pmd", "pytest", "jest"]
+STAGES = ["compile", "build", "test", "sast", "quality", "security", "push", "notify", "deploy"]
+BASES = ["alpine", "slim", "bookworm", "jre", "jdk", "distroless", "ubi", "musl"]
+FILLER = ["registry", "nexus", "image", "layer", "cache", "artifact", "runner", "docker",
+          "pipeline", "job", "script", "variables", "workdir", "expose", "entrypoint", "healthcheck"]
+
+
+def embed(text, dim):
+    """Feature-hashed bag-of-words embedding, L2-normalised"""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in text.lower().split():
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vec[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def build_corpus(size, seed):
+    """Synthesize `size` template documents with distinctive token mixes"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(size):
+        tokens = [
+            rng.choice(STACKS), rng.choice(FRAMEWORKS), rng.choice(BASES),
+            *rng.sample(TOOLS, 3), *rng.sample(STAGES, 3),
+            f"service{rng.randrange(size)}", f"team{rng.randrange(max(size // 50, 1))}",
+            *rng.sample(FILLER, 6)
+        ]
+        docs.append({"id": f"tpl-{i:06d}", "text": " ".join(tokens), "stack": tokens[0]})
+    return docs
+
+
+def build_queries(docs, count, seed):
+    """Labelled queries: a noisy subset of one template's tokens -> that template"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for doc in rng.sample(docs, min(count, len(docs))):
+        tokens = doc["text"].split()
+        kept = rng.sample(tokens, max(len(tokens) // 2, 3))
+        kept.append(rng.choice(FILLER))
+        queries.append({"text": " ".join(kept), "label": doc["id"]})
+    return queries
+
+
+def current_rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable, None on Windows)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def dir_size_mb(path):
+    total = sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+    return total / (1024 * 1024)
+
+
+def percentile(values, pct):
+    return float(np.percentile(np.array(values), pct)) if values else 0.0
+
+
+def exact_top_k(doc_matrix, query_vectors, k, space):
+    """Brute-force neighbours used as ground truth for ANN recall"""
+    if space == "l2":
+        scores = 2 * (query_vectors @ doc_matrix.T) - (doc_matrix ** 2).sum(axis=1)[None, :]
+    else:
+        scores = query_vectors @ doc_matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_config(docs, doc_matrix, queries, query_vectors, settings, k, batch_size):
+    """Build one collection with `settings` and replay the query set"""
+    workdir = tempfile.mkdtemp(prefix="chroma-bench-")
+    try:
+        client = chromadb.PersistentClient(path=workdir)
+        rss_before = current_rss_mb()
+        collection = client.create_collection(name="bench", metadata=settings)
+
+        start = time.perf_counter()
+        for offset in range(0, len(docs), batch_size):
+            batch = docs[offset:offset + batch_size]
+            collection.add(
+                ids=[d["id"] for d in batch],
+                documents=[d["text"] for d in batch],
+                embeddings=doc_matrix[offset:offset + batch_size].tolist(),
+                metadatas=[{"stack": d["stack"]} for d in batch]
+            )
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        ann_overlap = 0.0
+        exact = exact_top_k(doc_matrix, query_vectors, k, settings["hnsw:space"])
+        for i, query in enumerate(queries):
+            t0 = time.perf_counter()
+            results = collection.query(query_embeddings=[query_vectors[i].tolist()], n_results=k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            returned = results["ids"][0]
+            if query["label"] in returned:
+                hits += 1
+            expected = {docs[j]["id"] for j in exact[i]}
+            ann_overlap += len(expected.intersection(returned)) / k
+
+        rss_after = current_rss_mb()
+        return {
+            "settings": settings,
+            "corpus_size": len(docs),
+            "queries": len(queries),
+            "k": k,
+            "build_seconds": round(build_seconds, 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            f"recall@{k}": round(hits / len(queries), 4),
+            f"ann_recall@{k}": round(ann_overlap / len(queries), 4),
+            "rss_delta_mb": round(rss_after - rss_before, 1) if None not in (rss_after, rss_before) else None,
+            "disk_mb": round(dir_size_mb(workdir), 1)
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def select_profile(results, k, min_ann_recall):
+    """Fastest (p95) configuration that meets the ANN recall target at the largest size"""
+    largest = max(r["corpus_size"] for r in results)
+    candidates = [r for r in results if r["corpus_size"] == largest]
+    passing = [r for r in candidates if r[f"ann_recall@{k}"] >= min_ann_recall]
+    pool = passing or sorted(candidates, key=lambda r: -r[f"ann_recall@{k}"])[:1]
+    return min(pool, key=lambda r: (r["p95_ms"], -r[f"ann_recall@{k}"]))
+
+
+def parse_list(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChromaDB HNSW settings on a synthetic template corpus")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated corpus sizes (1k-100k)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of labelled queries to replay")
+    parser.add_argument("--k", type=int, default=5, help="Result count for recall@k")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--spaces", default="cosine,l2,ip", help="hnsw:space values to sweep")
+    parser.add_argument("--m", default="16,32", help="hnsw:M values to sweep")
+    parser.add_argument("--construction-ef", default="100,200", help="hnsw:construction_ef values to sweep")
+    parser.add_argument("--search-ef", default="10,50,100", help="hnsw:search_ef values to sweep")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per add() call")
+    parser.add_argument("--min-ann-recall", type=float, default=0.95, help="Recall target when selecting a profile")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write raw results")
+    parser.add_argument("--write-profile", nargs="?", const=str(DEFAULT_PROFILE), default=None,
+                        help=f"Write the selected settings as a profile for create_collections.py (default: {DEFAULT_PROFILE})")
+    args = parser.parse_args()
+
+    grid = [
+        {"hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": cef, "hnsw:search_ef": sef}
+        for space, m, cef, sef in itertools.product(
+            parse_list(args.spaces), parse_list(args.m, int),
+            parse_list(args.construction_ef, int), parse_list(args.search_ef, int)
+        )
+    ]
+
+    print("=" * 60)
+    print("ChromaDB Retrieval Benchmark")
+    print("=" * 60)
+
+    results = []
+    for size in parse_list(args.sizes, int):
+        docs = build_corpus(size, args.seed)
+        queries = build_queries(docs, args.queries, args.seed)
+        doc_matrix = np.stack([embed(d["text"], args.dim) for d in docs])
+        query_vectors = np.stack([embed(q["text"], args.dim) for q in queries])
+        print(f"\n[INFO] Corpus: {size} templates, {len(queries)} queries, {len(grid)} configurations")
+
+        for settings in grid:
+            result = run_config(docs, doc_matrix, queries, query_vectors, settings, args.k, args.batch_size)
+            results.append(result)
+            print(f"  space={settings['hnsw:space']:<6} M={settings['hnsw:M']:<3} "
+                  f"cef={settings['hnsw:construction_ef']:<4} sef={settings['hnsw:search_ef']:<4} "
+                  f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                  f"recall@{args.k}={result[f'recall@{args.k}']:.3f} "
+                  f"ann_recall@{args.k}={result[f'ann_recall@{args.k}']:.3f} "
+                  f"rss+={result['rss_delta_mb']}MB disk={result['disk_mb']}MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Raw results written to {args.output}")
+
+    best = select_profile(results, args.k, args.min_ann_recall)
+    print(f"[OK] Selected: {best['settings']} (p95={best['p95_ms']}ms, "
+          f"ann_recall@{args.k}={best[f'ann_recall@{args.k}']})")
+
+    if args.write_profile:
+        profile = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "benchmark": {k: v for k, v in best.items() if k != "settings"},
+            "selection": f"lowest p95 with ann_recall@{args.k} >= {args.min_ann_recall}",
+            "collections": {name: best["settings"] for name in COLLECTIONS}
+        }
+        with open(args.write_profile, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        print(f"[OK] Index profile written to {args.write_profile}")
+
+
+if __name__ == "__main__":
+    main()
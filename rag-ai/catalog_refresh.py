@@ -1,11 +1,15 @@
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from requests.auth import HTTPBasicAuth
 
+from registry_manifest import compressed_size
+
 # Nexus configuration
 NEXUS_URL = "http://localhost:5001"
 NEXUS_USER = "admin"
 NEXUS_PASS = "r"
+SIZE_WORKERS = 8
 
 # Initialize catalog structure
 catalog = {}
@@ -41,6 +45,22 @@ def get_tags(repo_name):
         print(f"[WARN] Failed to get tags for {repo_name}: {e}")
         return []
 
+def get_compressed_size(repo_name, tag):
+    """Compressed pull size of one image in bytes (config + layers); linux/amd64 for multi-arch images"""
+    try:
+        return compressed_size(NEXUS_URL, repo_name, tag, HTTPBasicAuth(NEXUS_USER, NEXUS_PASS))
+    except Exception as e:
+        print(f"[WARN] Failed to get size of {repo_name}:{tag}: {e}")
+        return None
+
+def classify_tag(tag):
+    """Image variant of a tag: jre, jdk, alpine, slim or full"""
+    # JRE/JDK first: "17-jre-alpine" is a JRE, "17-alpine-jdk" a JDK
+    for variant in ('jre', 'jdk', 'alpine', 'slim'):
+        if variant in tag:
+            return variant
+    return 'full'
+
 def extract_base_key(repo_name):
     """Extract base key from repository name"""
     # Example: apm-repo/demo/python -> python
@@ -96,6 +116,7 @@ print("Nexus Catalog Refresh")
 print("=" * 60)
 
 repositories = get_repositories()
+pool = ThreadPoolExecutor(max_workers=SIZE_WORKERS)
 
 for repo in repositories:
     print(f"\n[INFO] Processing: {repo}")
@@ -104,16 +125,24 @@ for repo in repositories:
     if tags:
         base_key = extract_base_key(repo)
         selected_tag = select_preferred_tag(tags, base_key)
+        sizes = dict(zip(tags, pool.map(lambda tag: get_compressed_size(repo, tag), tags)))
         
         catalog[base_key] = {
             "image_path": f"localhost:5001/{repo}",
             "tags": tags,
             "selected_tag": selected_tag,
-            "selection_rule": f"preferred or latest"
+            "selection_rule": f"preferred or latest",
+            # Compressed pull size in bytes and variant per tag, used to pick small runtime images
+            "sizes": sizes,
+            "variants": {tag: classify_tag(tag) for tag in tags}
         }
         print(f"  Base Key: {base_key}")
         print(f"  Tags: {len(tags)} found")
         print(f"  Selected: {selected_tag}")
+        if sizes.get(selected_tag):
+            print(f"  Size: {sizes[selected_tag] / 1e6:.1f} MB compressed")
+
+pool.shutdown()
 
 # Write catalog to file
 with open('catalog.json', 'w', encoding='utf-8') as f:
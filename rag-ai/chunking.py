@@ -0,0 +1,143 @@
+"""
+Split RAG corpus documents into section-level chunks.
+
+Golden rules are split by Markdown heading and GitLab CI templates by
+top-level job, so retrieval can return only the relevant rule section or
+pipeline job instead of the whole file. Every chunk carries its parent
+document metadata and a stable ID derived from the parent ID and the
+section/job name, so re-ingesting an unchanged file overwrites the same IDs.
+"""
+import hashlib
+import re
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+TOP_LEVEL_KEY_RE = re.compile(r"^([A-Za-z0-9_.\-]+)\s*:")
+STAGE_RE = re.compile(r"^\s+stage:\s*[\"']?([^\"'\s#]+)")
+
+# Top-level GitLab CI keys that configure the pipeline rather than define a job
+GITLAB_GLOBAL_KEYS = {
+    "stages", "variables", "default", "include", "workflow",
+    "image", "services", "cache", "before_script", "after_script"
+}
+
+
+def _slug(text):
+    """Lowercase, dash-separated form of a heading or job name"""
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "section"
+
+
+def _content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _make_chunk(parent_id, key, content, index, parent_metadata, extra, seen):
+    """Build one chunk dict, de-duplicating IDs within a parent document"""
+    slug = _slug(key)
+    seen[slug] = seen.get(slug, 0) + 1
+    if seen[slug] > 1:
+        slug = f"{slug}-{seen[slug]}"
+
+    metadata = dict(parent_metadata or {})
+    metadata.update({
+        "parent_id": parent_id,
+        "chunk_index": index,
+        "content_hash": _content_hash(content),
+    })
+    metadata.update(extra)
+    return {"id": f"{parent_id}#{slug}", "document": content, "metadata": metadata}
+
+
+def chunk_markdown(content, parent_id, parent_metadata=None, max_level=3):
+    """Split Markdown into one chunk per heading (up to max_level).
+
+    Each chunk starts with its heading breadcrumb (e.g. "NON-NEGOTIABLE
+    CONSTRAINTS > 1. Private Registry Only") so it reads on its own.
+    Headings without body text are folded into the breadcrumb of their
+    children instead of producing empty chunks.
+    """
+    sections = []
+    path = []
+    current = {"path": [], "lines": []}
+
+    for line in content.splitlines():
+        match = HEADING_RE.match(line)
+        if match and len(match.group(1)) <= max_level:
+            sections.append(current)
+            level = len(match.group(1))
+            path = [p for p in path if p[0] < level] + [(level, match.group(2))]
+            current = {"path": [title for _, title in path], "lines": []}
+        else:
+            current["lines"].append(line)
+    sections.append(current)
+
+    chunks = []
+    seen = {}
+    for section in sections:
+        body = "\n".join(section["lines"]).strip()
+        if not body:
+            continue
+        heading = " > ".join(section["path"]) or "preamble"
+        document = f"{heading}\n\n{body}" if section["path"] else body
+        chunks.append(_make_chunk(
+            parent_id, section["path"][-1] if section["path"] else "preamble",
+            document, len(chunks), parent_metadata,
+            {"chunk_type": "section", "section": heading}, seen
+        ))
+    return chunks
+
+
+def chunk_gitlab_ci(content, parent_id, parent_metadata=None):
+    """Split a .gitlab-ci.yml into a globals chunk plus one chunk per job.
+
+    Splitting is done on top-level keys in the original text so scripts,
+    block scalars and comments are preserved exactly. Comment lines directly
+    above a key belong to that key. Global keys (stages, variables, ...) are
+    collected into a single "globals" chunk.
+    """
+    blocks = []
+    pending_comments = []
+    current = None
+
+    for line in content.splitlines():
+        match = TOP_LEVEL_KEY_RE.match(line)
+        if match:
+            current = {"key": match.group(1), "lines": pending_comments + [line]}
+            pending_comments = []
+            blocks.append(current)
+        elif line.startswith("#"):
+            pending_comments.append(line)
+        elif current is not None:
+            if pending_comments:
+                current["lines"].extend(pending_comments)
+                pending_comments = []
+            current["lines"].append(line)
+
+    globals_lines = []
+    jobs = []
+    for block in blocks:
+        text = "\n".join(block["lines"]).strip()
+        if block["key"] in GITLAB_GLOBAL_KEYS:
+            globals_lines.append(text)
+        else:
+            jobs.append((block["key"], text))
+
+    chunks = []
+    seen = {}
+    if globals_lines:
+        chunks.append(_make_chunk(
+            parent_id, "globals", "\n\n".join(globals_lines), 0, parent_metadata,
+            {"chunk_type": "globals", "section": "globals"}, seen
+        ))
+    for job_name, text in jobs:
+        stage = ""
+        for job_line in text.splitlines():
+            stage_match = STAGE_RE.match(job_line)
+            if stage_match:
+                stage = stage_match.group(1)
+                break
+        chunk_type = "template" if job_name.startswith(".") else "job"
+        chunks.append(_make_chunk(
+            parent_id, job_name, text, len(chunks), parent_metadata,
+            {"chunk_type": chunk_type, "section": job_name, "job": job_name, "stage": stage}, seen
+        ))
+    return chunks
@@ -1,19 +1,34 @@
 import chromadb
+import json
+import os
+from pathlib import Path
+
+from rag_collections import COLLECTIONS
 
 # Connect to ChromaDB (adjust host/port if needed)
 client = chromadb.HttpClient(host='localhost', port=8000)
 
-# Create collections
-collections = [
-    "templates_dockerfile",
-    "templates_gitlab", 
-    "golden_rules"
-]
+# Index settings tuned by benchmark_retrieval.py (--write-profile); defaults apply when absent
+profile_path = Path(os.getenv("INDEX_PROFILE", Path(__file__).parent / "index_profile.json"))
+profile = {}
+if profile_path.exists():
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        profile = json.load(f).get("collections", {})
+    print(f"[OK] Using index profile: {profile_path}")
 
-for collection_name in collections:
+# Create collections
+for collection_name in COLLECTIONS:
+    settings = profile.get(collection_name) or None
     try:
-        collection = client.get_or_create_collection(name=collection_name)
+        collection = client.get_or_create_collection(name=collection_name, metadata=settings)
         print(f"[OK] Collection '{collection_name}' created/verified")
+        # HNSW settings are fixed at creation time; flag collections built with other values
+        if settings:
+            current = collection.metadata or {}
+            stale = {k: v for k, v in settings.items() if current.get(k) != v}
+            if stale:
+                print(f"  [WARN] Existing index differs from profile {stale}; "
+                      f"delete and re-create '{collection_name}' then re-run ingest_templates.py to apply")
     except Exception as e:
         print(f"[ERROR] creating '{collection_name}': {e}")
 
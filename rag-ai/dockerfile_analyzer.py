@@ -0,0 +1,377 @@
+"""
+Static Dockerfile analysis for layer-cache friendliness and image bloat.
+
+The parser turns a Dockerfile into a flat list of instructions (comments and
+blank lines included, so a rewrite keeps them) tagged with their build stage.
+The analyzer runs a fixed set of rules over that list; every finding names the
+rule, the line it applies to, whether it costs cache hits or image size, and
+whether rewrite_dockerfile() can fix it. Scores start at 100 and lose points
+per finding by severity; bloat is a rough per-rule estimate in MB.
+"""
+import re
+
+SEVERITY_POINTS = {"high": 25, "medium": 10, "low": 5}
+
+# Dependency installs whose layer should only depend on the manifests:
+# manager -> (command pattern, manifests to copy first, prefetch command or None when the install itself can move)
+DEPENDENCY_INSTALLS = {
+    "pip": (re.compile(r"\bpip3? install\b.*\s-r\s"), ["requirements.txt"], None),
+    "npm": (re.compile(r"\bnpm (ci|install)\b(?!.*\s-g\b)"), ["package*.json"], None),
+    "yarn": (re.compile(r"\byarn install\b"), ["package.json", "yarn.lock"], None),
+    "bundler": (re.compile(r"\bbundle install\b"), ["Gemfile", "Gemfile.lock*"], None),
+    "composer": (re.compile(r"\bcomposer install\b"), ["composer.json", "composer.lock*"], None),
+    "maven": (re.compile(r"\bmvn\b"), ["pom.xml"], "mvn -B dependency:go-offline"),
+    "gradle": (re.compile(r"\bgradle\b"), ["build.gradle*", "settings.gradle*"], "gradle dependencies --no-daemon"),
+    "go": (re.compile(r"\bgo (mod download|build)\b"), ["go.mod", "go.sum*"], "go mod download"),
+    "cargo": (re.compile(r"\bcargo (build|fetch)\b"), ["Cargo.toml", "Cargo.lock*"],
+              'mkdir -p src && echo "fn main() {}" > src/main.rs && cargo fetch')
+}
+REQUIREMENTS_RE = re.compile(r"\s-r\s+(\S+)")
+
+# Compile steps that leave a toolchain behind in a single-stage image, with the typical toolchain size in MB
+COMPILE_TOOLCHAINS = {
+    "maven": (re.compile(r"\bmvn\b.*\b(package|install|verify)\b"), 350),
+    "gradle": (re.compile(r"\b(gradle|\./gradlew)\b.*\b(build|assemble|bootJar|jar)\b"), 400),
+    "go": (re.compile(r"\bgo build\b"), 500),
+    "cargo": (re.compile(r"\bcargo build\b"), 800),
+    "dotnet": (re.compile(r"\bdotnet (publish|build)\b"), 500),
+    "node": (re.compile(r"\bnpm run build\b"), 250)
+}
+
+# Base images and packages that only belong in a builder stage
+BUILDER_IMAGE_RE = re.compile(r"(^|/)(maven|gradle|golang|rust)(:|$)|jdk|dotnet/sdk|(^|/)sdk:", re.IGNORECASE)
+BUILD_PACKAGES_RE = re.compile(r"\b(build-base|build-essential|gcc|g\+\+|make|git|cmake)\b")
+BUILD_PACKAGES_REMOVED_RE = re.compile(r"\bapk del\b|\bapt-get (purge|remove)\b|\bapt-get autoremove\b")
+
+# Package manager commands that belong in one RUN; apt-get update is grouped with its install
+PACKAGE_GROUPS = {
+    "apk": re.compile(r"^apk (add|update)\b"),
+    "apt": re.compile(r"^apt-get (update|install)\b"),
+    "pip": re.compile(r"^pip3? install\b(?!.*\s-r\s)"),
+    "npm": re.compile(r"^npm install -g\b"),
+    "gem": re.compile(r"^gem install\b")
+}
+
+# apk add calls without --no-cache, checked per call since a merged RUN can mix both
+APK_ADD_CACHED_RE = re.compile(r"\bapk add\b(?!\s+--no-cache)")
+# "apk update && " ahead of an apk add, with an optional line continuation; apk add --no-cache fetches its own index
+APK_UPDATE_RE = re.compile(r"\bapk update\s*&&\s*(?:\\\s*\n\s*)?")
+
+COPY_ALL_RE = re.compile(r"^(?:--(?!from)\S+\s+)*\.\s+(\S+)$")
+MOVABLE_BETWEEN = {"ENV", "ARG", "LABEL", "EXPOSE"}
+
+
+def parse_dockerfile(content):
+    """Parse a Dockerfile into instruction dicts.
+
+    Each entry has the upper-cased instruction ("#" for comments, "" for blank
+    lines), its arguments with line continuations joined, the first line
+    number, the stage index (0-based, counted by FROM) and the raw source text.
+    """
+    instructions = []
+    stage = 0
+    seen_from = False
+    buffer = []
+    start = 0
+
+    for number, line in enumerate(content.splitlines(), 1):
+        stripped = line.strip()
+        if not buffer and (not stripped or stripped.startswith("#")):
+            instructions.append({"instruction": "#" if stripped else "", "args": stripped,
+                                 "line": number, "stage": stage, "raw": line})
+            continue
+        if not buffer:
+            start = number
+        buffer.append(line)
+        if stripped.endswith("\\") or (stripped.startswith("#") and len(buffer) > 1):
+            continue
+
+        text = " ".join(
+            l.strip().rstrip("\\").strip() for l in buffer if not l.strip().startswith("#")
+        ).strip()
+        keyword, _, args = text.partition(" ")
+        keyword = keyword.upper()
+        if keyword == "FROM":
+            stage += 1 if seen_from else 0
+            seen_from = True
+        instructions.append({"instruction": keyword, "args": args.strip(), "line": start,
+                             "stage": stage, "raw": "\n".join(buffer)})
+        buffer = []
+
+    return instructions
+
+
+def stages(instructions):
+    """FROM instructions as [{"index", "image", "alias", "line"}]"""
+    result = []
+    for entry in instructions:
+        if entry["instruction"] == "FROM":
+            parts = [p for p in entry["args"].split() if not p.startswith("--")]
+            alias = parts[2] if len(parts) >= 3 and parts[1].lower() == "as" else None
+            result.append({"index": entry["stage"], "image": parts[0] if parts else "",
+                           "alias": alias, "line": entry["line"]})
+    return result
+
+
+def _commands(entry):
+    """&&-separated shell commands of a RUN, without RUN flags such as --mount"""
+    args = re.sub(r"^(--\S+\s+)*", "", entry["args"])
+    return [c.strip() for c in args.split("&&") if c.strip()]
+
+
+def _finding(rule, category, severity, line, message, fixable=False, bloat_mb=0):
+    return {"rule": rule, "category": category, "severity": severity, "line": line,
+            "message": message, "fixable": fixable, "bloat_mb": bloat_mb}
+
+
+def _dependency_manager(entry):
+    """Name of the dependency manager a RUN installs with, if any"""
+    if entry["instruction"] != "RUN":
+        return None
+    for manager, (pattern, _, _) in DEPENDENCY_INSTALLS.items():
+        if pattern.search(entry["args"]):
+            return manager
+    return None
+
+
+def _manifests(manager, entry):
+    """Files a dependency install reads; pip takes them from its -r options"""
+    if manager == "pip":
+        return REQUIREMENTS_RE.findall(entry["args"]) or DEPENDENCY_INSTALLS[manager][1]
+    return DEPENDENCY_INSTALLS[manager][1]
+
+
+def _manifest_dirs(manifests):
+    """Manifests grouped by their directory in the build context -> [(directory, [manifest, ...])]"""
+    groups = {}
+    for manifest in manifests:
+        groups.setdefault(manifest.rpartition("/")[0], []).append(manifest)
+    return list(groups.items())
+
+
+def _copy_before_install(instructions):
+    """(copy index, install index, manager, fixable) for each stage that copies the whole context before installing dependencies"""
+    hits = []
+    copy_at = {}
+    copied = {}
+    for index, entry in enumerate(instructions):
+        if entry["instruction"] in ("COPY", "ADD") and COPY_ALL_RE.match(entry["args"]):
+            copy_at.setdefault(entry["stage"], index)
+            continue
+        if entry["instruction"] in ("COPY", "ADD") and entry["stage"] not in copy_at:
+            copied.setdefault(entry["stage"], []).append(entry["args"])
+        manager = _dependency_manager(entry)
+        copy_index = copy_at.get(entry["stage"])
+        # Manifests copied ahead of the sources already give the dependency layer its own cache key
+        if manager and any(_manifests(manager, entry)[0].rstrip("*") in args for args in copied.get(entry["stage"], [])):
+            continue
+        if manager and copy_index is not None and all(h[0] != copy_index for h in hits):
+            _, _, prefetch = DEPENDENCY_INSTALLS[manager]
+            if prefetch:
+                fixable = True
+            else:
+                # The install moves in front of the sources: only safe when it installs nothing else and nothing in between needs the sources
+                pattern = DEPENDENCY_INSTALLS[manager][0]
+                between = instructions[copy_index + 1:index]
+                fixable = all(pattern.search(c) or c.startswith("pip install --upgrade") for c in _commands(entry)) and all(
+                    e["instruction"] in MOVABLE_BETWEEN or e["instruction"] in ("", "#") for e in between
+                )
+            hits.append((copy_index, index, manager, fixable))
+    return hits
+
+
+def _package_groups(instructions):
+    """Runs of consecutive RUNs in one stage that only call the same package manager -> [(group, [indexes])]"""
+    groups = []
+    current = None
+    for index, entry in enumerate(instructions):
+        if entry["instruction"] in ("", "#"):
+            continue
+        group = None
+        if entry["instruction"] == "RUN" and not entry["args"].startswith("--"):
+            commands = _commands(entry)
+            for name, pattern in PACKAGE_GROUPS.items():
+                if commands and all(pattern.match(c) or c.startswith("rm -rf /var/lib/apt/lists") for c in commands):
+                    group = name
+                    break
+        if group and current and current[0] == group and instructions[current[1][-1]]["stage"] == entry["stage"]:
+            current[1].append(index)
+        else:
+            current = (group, [index]) if group else None
+            if current:
+                groups.append(current)
+    return [g for g in groups if len(g[1]) > 1]
+
+
+def analyze_dockerfile(content):
+    """Findings plus cache and size scores for a Dockerfile"""
+    instructions = parse_dockerfile(content)
+    stage_list = stages(instructions)
+    final_stage = stage_list[-1]["index"] if stage_list else 0
+    findings = []
+
+    for copy_index, install_index, manager, fixable in _copy_before_install(instructions):
+        findings.append(_finding(
+            "copy-before-dependencies", "cache", "high", instructions[copy_index]["line"],
+            f"The whole build context is copied before the {manager} dependency install on line "
+            f"{instructions[install_index]['line']}: any source change re-runs it. Copy "
+            f"{' '.join(DEPENDENCY_INSTALLS[manager][1])} first and install before copying the sources.",
+            fixable=fixable
+        ))
+
+    for group, indexes in _package_groups(instructions):
+        findings.append(_finding(
+            "separate-package-runs", "cache", "medium", instructions[indexes[0]]["line"],
+            f"{len(indexes)} consecutive RUN instructions call {group}: each adds a layer, and a separate "
+            f"package index update goes stale in the cache. Combine them into one RUN.",
+            fixable=True, bloat_mb=5 * (len(indexes) - 1)
+        ))
+
+    if len(stage_list) <= 1:
+        for entry in instructions:
+            if entry["instruction"] != "RUN":
+                continue
+            for toolchain, (pattern, size) in COMPILE_TOOLCHAINS.items():
+                if pattern.search(entry["args"]):
+                    findings.append(_finding(
+                        "no-multistage", "size", "high", entry["line"],
+                        f"{toolchain} compiles in the only stage, so the toolchain and build cache ship in the image. "
+                        f"Build in a builder stage and copy only the artifact into a runtime base image.",
+                        bloat_mb=size
+                    ))
+                    break
+    elif BUILDER_IMAGE_RE.search(stage_list[-1]["image"]):
+        findings.append(_finding(
+            "builder-image-in-runtime", "size", "high", stage_list[-1]["line"],
+            f"The final stage runs on {stage_list[-1]['image']}, a build image. Use a JRE, slim or alpine runtime image.",
+            bloat_mb=200
+        ))
+
+    for entry in instructions:
+        if entry["instruction"] != "RUN":
+            continue
+        args = entry["args"]
+        cache_mount = "--mount=type=cache" in args
+        if APK_ADD_CACHED_RE.search(args) and "/var/cache/apk" not in args:
+            findings.append(_finding(
+                "apk-no-cache", "size", "low", entry["line"],
+                "apk add without --no-cache keeps the package index in the layer.", fixable=True, bloat_mb=5
+            ))
+        if re.search(r"\bapk update\b", args) and "/var/cache/apk" not in args:
+            findings.append(_finding(
+                "apk-update-index", "size", "low", entry["line"],
+                "apk update writes the package index into the layer; apk add --no-cache fetches it without keeping it.",
+                fixable=bool(APK_UPDATE_RE.search(args) and re.search(r"\bapk add\b", args)), bloat_mb=5
+            ))
+        if re.search(r"\bapt-get install\b", args):
+            if "/var/lib/apt/lists" not in args:
+                findings.append(_finding(
+                    "apt-lists-left", "size", "medium", entry["line"],
+                    "apt-get install without removing /var/lib/apt/lists in the same RUN keeps the package lists in the layer.",
+                    fixable=True, bloat_mb=40
+                ))
+            if "--no-install-recommends" not in args:
+                findings.append(_finding(
+                    "apt-recommends", "size", "low", entry["line"],
+                    "apt-get install without --no-install-recommends pulls recommended packages.", fixable=True, bloat_mb=50
+                ))
+        if re.search(r"\bpip3? install\b", args) and "--no-cache-dir" not in args and not cache_mount:
+            findings.append(_finding(
+                "pip-cache", "size", "low", entry["line"],
+                "pip install without --no-cache-dir (or a cache mount) keeps downloaded wheels in the layer.",
+                fixable=True, bloat_mb=30
+            ))
+        if entry["stage"] == final_stage and len(stage_list) > 1 and BUILD_PACKAGES_RE.search(args) \
+                and re.search(r"\b(apk add|apt-get install)\b", args) and not BUILD_PACKAGES_REMOVED_RE.search(args):
+            findings.append(_finding(
+                "build-tools-in-runtime", "size", "medium", entry["line"],
+                "Compilers or build tools are installed in the runtime stage. Install them in the builder stage instead.",
+                bloat_mb=150
+            ))
+
+    cache_points = sum(SEVERITY_POINTS[f["severity"]] for f in findings if f["category"] == "cache")
+    size_points = sum(SEVERITY_POINTS[f["severity"]] for f in findings if f["category"] == "size")
+    findings.sort(key=lambda f: f["line"])
+    return {
+        "stages": len(stage_list),
+        "cache_score": max(0, 100 - cache_points),
+        "size_score": max(0, 100 - size_points),
+        "estimated_bloat_mb": sum(f["bloat_mb"] for f in findings),
+        "findings": findings
+    }
+
+
+def _run(entry, commands, flags=""):
+    """Copy of a RUN entry with new commands, one per continuation line"""
+    args = (flags + " " if flags else "") + " && \\\n    ".join(commands)
+    return dict(entry, args=args.replace(" \\\n    ", " "), raw=f"RUN {args}")
+
+
+def _fix_run(entry):
+    """apk/apt/pip flags that keep package caches out of the layer, applied to the raw text to keep its formatting"""
+    args = entry["args"]
+    if args.startswith("["):
+        return entry
+    fixes = []
+    if APK_ADD_CACHED_RE.search(args) and "/var/cache/apk" not in args:
+        fixes.append((APK_ADD_CACHED_RE, "apk add --no-cache"))
+    if re.search(r"\bapt-get install\b", args) and "--no-install-recommends" not in args:
+        fixes.append((r"\bapt-get install\b", "apt-get install --no-install-recommends"))
+    if re.search(r"\bpip3? install\b", args) and "--no-cache-dir" not in args and "--mount=type=cache" not in args:
+        fixes.append((r"\b(pip3?) install\b", r"\1 install --no-cache-dir"))
+    if re.search(r"\bapk add\b", args) and "/var/cache/apk" not in args:
+        fixes.append((APK_UPDATE_RE, ""))
+    raw = entry["raw"]
+    for pattern, replacement in fixes:
+        args = re.sub(pattern, replacement, args)
+        raw = re.sub(pattern, replacement, raw)
+    if re.search(r"\bapt-get install\b", args) and "/var/lib/apt/lists" not in args:
+        args += " && rm -rf /var/lib/apt/lists/*"
+        raw += " && \\\n    rm -rf /var/lib/apt/lists/*"
+    return dict(entry, args=args, raw=raw)
+
+
+def rewrite_dockerfile(content):
+    """Apply every fixable finding and return the rewritten Dockerfile.
+
+    Dependency manifests are copied (and fetched, for compiled languages)
+    before the build context, consecutive package manager RUNs are merged and
+    package caches are removed in the layer that creates them. Instructions
+    that are not touched keep their original text.
+    """
+    instructions = parse_dockerfile(content)
+
+    # Merge package manager runs first: indexes below are recomputed after each structural change
+    for group, indexes in reversed(_package_groups(instructions)):
+        commands = [c for i in indexes for c in _commands(instructions[i])]
+        instructions[indexes[0]:indexes[-1] + 1] = [_run(instructions[indexes[0]], commands)]
+
+    instructions = [_fix_run(e) if e["instruction"] == "RUN" else e for e in instructions]
+
+    for copy_index, install_index, manager, fixable in reversed(_copy_before_install(instructions)):
+        if not fixable:
+            continue
+        copy_entry = instructions[copy_index]
+        flags = re.match(r"^((?:--\S+\s+)*)", copy_entry["args"]).group(1)
+        destination = COPY_ALL_RE.match(copy_entry["args"]).group(1)
+        prefetch = DEPENDENCY_INSTALLS[manager][2]
+        manifest_copies = []
+        for directory, manifests in _manifest_dirs(_manifests(manager, instructions[install_index])):
+            # Nested manifests keep their directory so the install finds them where the sources would put them
+            if directory:
+                target = ("" if destination in (".", "./") else destination.rstrip("/") + "/") + directory + "/"
+            else:
+                single = len(manifests) == 1 and "*" not in manifests[0]
+                target = destination if destination.endswith("/") or (destination == "." and single) else destination.rstrip("/") + "/"
+            manifest_args = f"{flags}{' '.join(manifests)} {target}"
+            manifest_copies.append(dict(copy_entry, instruction="COPY", args=manifest_args, raw=f"COPY {manifest_args}"))
+        if prefetch:
+            fetch = dict(copy_entry, instruction="RUN", args=prefetch, raw=f"RUN {prefetch}")
+            instructions[copy_index:copy_index] = manifest_copies + [fetch]
+        else:
+            # Sources follow the install instead of preceding it
+            install = instructions[install_index]
+            instructions[install_index:install_index + 1] = [install, copy_entry]
+            instructions[copy_index:copy_index + 1] = manifest_copies
+
+    return "\n".join(e["raw"] for e in instructions) + ("\n" if content.endswith("\n") else "")
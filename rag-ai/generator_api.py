@@ -1,10 +1,20 @@
 from fastapi import FastAPI, HTTPException
+import requests
+from requests.auth import HTTPBasicAuth
 from pydantic import BaseModel
 import chromadb
 import json
 import logging
+import os
+import re
+import time
 from typing import Optional
 from datetime import datetime
+from pathlib import Path
+
+from dockerfile_analyzer import analyze_dockerfile, rewrite_dockerfile
+from registry_manifest import compressed_size
+from template_composer import compose_dockerfile, compose_gitlab_ci, parse_refs
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -16,17 +26,55 @@ app = FastAPI(title="AI Dockerfile & GitLab CI Generator")
 chroma_client = chromadb.HttpClient(host='localhost', port=8000)
 dockerfile_collection = chroma_client.get_collection("templates_dockerfile")
 gitlab_collection = chroma_client.get_collection("templates_gitlab")
+gitlab_jobs_collection = chroma_client.get_collection("templates_gitlab_jobs")
+fragments_collection = chroma_client.get_collection("templates_fragments")
+combinations_collection = chroma_client.get_collection("templates_combinations")
 golden_rules_collection = chroma_client.get_collection("golden_rules")
 
 # Load catalog
 with open('rag-ai/catalog.json', 'r') as f:
     CATALOG = json.load(f)
 
+# Template variants: classic, or optimized (BuildKit cache mounts); .dockerignore files per stack
+DOCKERFILE_VARIANTS = ["classic", "optimized"]
+DOCKERIGNORE_DIR = Path("rag-ai/rag_corpus/dockerignore")
+
+# Final-stage images per stack: catalog keys to search and the tag variants able to
+# run the app. The smallest same-version candidate by recorded compressed size wins;
+# builder stages keep their full image
+RUNTIME_IMAGES = {
+    "java": (["temurin", "java"], ["jre"]),
+    "python": (["python"], ["slim"]),
+    "node": (["node"], ["alpine", "slim"]),
+}
+TAG_VERSION_RE = re.compile(r"v?(\d+(?:\.\d+)*)")
+
+# Compressed sizes looked up in the registry for images catalog.json has no size for
+# (catalog generated before sizes were recorded): image -> (size, retry time or None when final).
+# Lookups sit on the request path, so they time out fast and a failure is not retried for
+# REGISTRY_RETRY_SECONDS; an unreachable registry is skipped for every image in that window
+REGISTRY_SIZES = {}
+REGISTRY_UNREACHABLE = {}
+REGISTRY_TIMEOUT = 2
+REGISTRY_RETRY_SECONDS = 300
+NEXUS_AUTH = HTTPBasicAuth(os.getenv("NEXUS_USERNAME", "admin"), os.getenv("NEXUS_PASSWORD", ""))
+
+# Template fragments by "id@content_hash"; a re-ingested fragment gets a new key
+FRAGMENT_CACHE = {}
+
 class DockerfileRequest(BaseModel):
     stack: str  # java, python, node
     framework: Optional[str] = None
     port: Optional[int] = 8080
     workdir: Optional[str] = "/app"
+    variant: Optional[str] = "classic"  # classic, optimized
+
+class ComposeRequest(BaseModel):
+    stack: str  # java, python, node
+    build_tool: Optional[str] = None  # maven, pip, poetry, npm, yarn
+    framework: Optional[str] = None  # spring-boot, micronaut, fastapi, flask, express
+    port: Optional[int] = 8080
+    workdir: Optional[str] = "/app"
 
 class GitLabCIRequest(BaseModel):
     stack: str  # java, python, node
@@ -64,15 +112,113 @@ def list_collections():
         return {
             "templates_dockerfile": dockerfile_collection.count(),
             "templates_gitlab": gitlab_collection.count(),
+            "templates_gitlab_jobs": gitlab_jobs_collection.count(),
+            "templates_fragments": fragments_collection.count(),
+            "templates_combinations": combinations_collection.count(),
             "golden_rules": golden_rules_collection.count()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _tag_variant(info, tag):
+    """Variant of a catalog tag as recorded by catalog_refresh.py, derived from the tag otherwise"""
+    recorded = info.get("variants", {}).get(tag)
+    if recorded:
+        return recorded
+    return next((v for v in ("jre", "jdk", "alpine", "slim") if v in tag), "full")
+
+def _registry_size(image_path, tag):
+    """Compressed size in bytes of `image_path:tag` from its registry manifest, None when unavailable"""
+    image = f"{image_path}:{tag}"
+    now = time.monotonic()
+    if image in REGISTRY_SIZES:
+        size, retry_at = REGISTRY_SIZES[image]
+        if retry_at is None or retry_at > now:
+            return size
+    registry, _, repo = image_path.partition("/")
+    if REGISTRY_UNREACHABLE.get(registry, 0) > now:
+        return None
+    try:
+        REGISTRY_SIZES[image] = (compressed_size(f"http://{registry}", repo, tag, NEXUS_AUTH, timeout=REGISTRY_TIMEOUT), None)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        REGISTRY_UNREACHABLE[registry] = now + REGISTRY_RETRY_SECONDS
+        logger.warning(f"Registry {registry} unreachable, skipping size lookups for {REGISTRY_RETRY_SECONDS}s: {e}")
+        return None
+    except Exception as e:
+        REGISTRY_SIZES[image] = (None, now + REGISTRY_RETRY_SECONDS)
+        logger.warning(f"Could not read size of {image} from the registry: {e}")
+    return REGISTRY_SIZES[image][0]
+
+def _tag_size(info, tag):
+    """Compressed size in bytes of a catalog tag: recorded by catalog_refresh.py, else from the registry"""
+    size = info.get("sizes", {}).get(tag)
+    return size if size is not None else _registry_size(info["image_path"], tag)
+
+def _image_size(image):
+    """Compressed size in bytes of a catalog image, None when unknown"""
+    image_path, _, tag = image.rpartition(":")
+    for info in CATALOG.values():
+        if info["image_path"] == image_path:
+            return _tag_size(info, tag)
+    return None
+
+def select_runtime_image(stack, image):
+    """Smallest catalog image that can replace `image` in the final stage.
+
+    Candidates share the version of `image` ("17", "3.12") and have one of the
+    stack's runtime variants; known sizes rank first, variant order breaks
+    ties. Returns (image, compressed size in bytes or None).
+    """
+    keys, variants = RUNTIME_IMAGES.get(stack, ([], []))
+    version = TAG_VERSION_RE.match(image.rpartition(":")[2])
+    candidates = []
+    for key in keys:
+        info = CATALOG.get(key)
+        if not info or not version:
+            continue
+        for tag in info["tags"]:
+            match = TAG_VERSION_RE.match(tag)
+            variant = _tag_variant(info, tag)
+            if match and match.group(1) == version.group(1) and variant in variants:
+                size = _tag_size(info, tag)
+                candidates.append((size is None, size or 0, variants.index(variant), f"{info['image_path']}:{tag}"))
+    if not candidates:
+        return image, _image_size(image)
+    best = min(candidates)
+    return best[3], (None if best[0] else best[1])
+
+def apply_runtime_image(dockerfile, stack):
+    """Swap the final stage's image for the smallest compatible one; earlier (builder) stages are left alone.
+    Returns (dockerfile, runtime image or None, compressed size in bytes or None)"""
+    lines = dockerfile.split("\n")
+    final_from = max((i for i, line in enumerate(lines) if line.startswith("FROM ")), default=None)
+    if final_from is None:
+        return dockerfile, None, None
+    template_image = lines[final_from].split()[1]
+    runtime_image, pull_size = select_runtime_image(stack, template_image)
+    lines[final_from] = lines[final_from].replace(template_image, runtime_image, 1)
+    return "\n".join(lines), runtime_image, pull_size
+
+def check_public_registries(dockerfile):
+    """Reject generated Dockerfiles that pull from a public registry"""
+    public_registries = ["docker.io", "FROM python:", "FROM node:", "FROM openjdk:", "ghcr.io"]
+    for reg in public_registries:
+        if reg in dockerfile:
+            raise HTTPException(
+                status_code=400,
+                detail=f"VALIDATION_FAILED: Public registry '{reg}' detected in generated Dockerfile"
+            )
+
 @app.post("/generate/dockerfile")
 def generate_dockerfile(request: DockerfileRequest):
     """Generate Dockerfile from templates and Nexus catalog"""
-    logger.info(f"Dockerfile request: stack={request.stack}, framework={request.framework}")
+    logger.info(f"Dockerfile request: stack={request.stack}, framework={request.framework}, variant={request.variant}")
+
+    if request.variant not in DOCKERFILE_VARIANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown variant '{request.variant}'. Available variants: {DOCKERFILE_VARIANTS}"
+        )
 
     # Step 1: Classify request
     base_key = request.stack
@@ -93,7 +239,7 @@ def generate_dockerfile(request: DockerfileRequest):
         results = dockerfile_collection.query(
             query_texts=[f"{request.stack} {request.framework or ''} application"],
             n_results=1,
-            where={"stack": request.stack}
+            where={"$and": [{"stack": request.stack}, {"variant": request.variant}]}
         )
     except Exception as e:
         logger.error(f"ChromaDB query failed: {e}")
@@ -102,7 +248,7 @@ def generate_dockerfile(request: DockerfileRequest):
     if not results['ids'][0]:
         raise HTTPException(
             status_code=404,
-            detail=f"TEMPLATE_MISSING: No Dockerfile template for stack '{request.stack}'. "
+            detail=f"TEMPLATE_MISSING: No {request.variant} Dockerfile template for stack '{request.stack}'. "
                    f"Run 'python ingest_templates.py' to load templates."
         )
 
@@ -114,6 +260,8 @@ def generate_dockerfile(request: DockerfileRequest):
     dockerfile = template_content.replace("${BASE_REGISTRY}", "localhost:5001")
     dockerfile = dockerfile.replace("ARG BASE_REGISTRY=ai-nexus:5001", f"# Base: {base_image}")
 
+    dockerfile, runtime_image, pull_size = apply_runtime_image(dockerfile, request.stack)
+
     # Only replace workdir and port if they differ from defaults
     if request.workdir != "/app":
         dockerfile = dockerfile.replace("/app", request.workdir)
@@ -121,25 +269,28 @@ def generate_dockerfile(request: DockerfileRequest):
         dockerfile = dockerfile.replace("8080", str(request.port))
 
     # Step 5: Validate (check for public registry references)
-    public_registries = ["docker.io", "FROM python:", "FROM node:", "FROM openjdk:", "ghcr.io"]
-    for reg in public_registries:
-        if reg in dockerfile:
-            raise HTTPException(
-                status_code=400,
-                detail=f"VALIDATION_FAILED: Public registry '{reg}' detected in generated Dockerfile"
-            )
+    check_public_registries(dockerfile)
+
+    # Step 6: Build context filter for the stack
+    dockerignore_file = DOCKERIGNORE_DIR / f"{request.stack}.dockerignore"
+    dockerignore = dockerignore_file.read_text(encoding="utf-8") if dockerignore_file.exists() else None
 
-    logger.info(f"Dockerfile generated: template={template_id}, base={base_image}")
+    logger.info(f"Dockerfile generated: template={template_id}, base={base_image}, runtime={runtime_image}")
 
     return {
         "content": dockerfile,
+        "dockerignore": dockerignore,
         "audit": {
             "template_id": template_id,
             "base_image": base_image,
+            "runtime_image": runtime_image,
+            "expected_pull_bytes": pull_size,
+            "expected_pull_mb": round(pull_size / 1e6, 1) if pull_size else None,
             "stack": request.stack,
             "framework": request.framework,
             "port": request.port,
             "workdir": request.workdir,
+            "variant": request.variant,
             "template_metadata": template_metadata,
             "generated_at": datetime.utcnow().isoformat()
         }
@@ -199,9 +350,158 @@ def generate_gitlab_ci(request: GitLabCIRequest):
         }
     }
 
+def fetch_fragments(refs):
+    """Fragments for "id@hash" references: cached ones from memory, the rest in one ChromaDB get.
+    Returns (fragments in reference order, number of cache hits)"""
+    missing = [ref for ref in refs if ref not in FRAGMENT_CACHE]
+    if missing:
+        results = fragments_collection.get(ids=[ref.split("@")[0] for ref in missing])
+        for fragment_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            FRAGMENT_CACHE[f"{fragment_id}@{metadata['content_hash']}"] = {
+                "id": fragment_id, "document": document, "metadata": metadata
+            }
+    stale = [ref for ref in refs if ref not in FRAGMENT_CACHE]
+    if stale:
+        raise HTTPException(
+            status_code=404,
+            detail=f"TEMPLATE_MISSING: Fragments {stale} changed or removed since the combination index was built. "
+                   f"Run 'python ingest_templates.py' to rebuild it."
+        )
+    return [FRAGMENT_CACHE[ref] for ref in refs], len(refs) - len(missing)
+
+@app.get("/combinations")
+def list_combinations(stack: Optional[str] = None):
+    """List the stack x build tool x framework combinations the fragments can compose"""
+    results = combinations_collection.get(where={"stack": stack} if stack else None)
+    return {
+        "combinations": [
+            {"id": cid, "stack": m["stack"], "build_tool": m["build_tool"], "framework": m["framework"]}
+            for cid, m in zip(results['ids'], results['metadatas'])
+        ]
+    }
+
+@app.post("/generate/composed")
+def generate_composed(request: ComposeRequest):
+    """Generate a Dockerfile and .gitlab-ci.yml composed from fragments for one combination.
+    Omitted build_tool / framework are picked by similarity within the stack"""
+    logger.info(f"Composed request: stack={request.stack}, build_tool={request.build_tool}, framework={request.framework}")
+
+    # Step 1: Find the combination
+    filters = [{key: value} for key, value in
+               (("stack", request.stack), ("build_tool", request.build_tool), ("framework", request.framework)) if value]
+    try:
+        results = combinations_collection.query(
+            query_texts=[f"{request.stack} {request.framework or ''} {request.build_tool or ''} application"],
+            n_results=1,
+            where={"$and": filters} if len(filters) > 1 else filters[0]
+        )
+    except Exception as e:
+        logger.error(f"ChromaDB query failed: {e}")
+        raise HTTPException(status_code=500, detail=f"ChromaDB query error: {str(e)}")
+
+    if not results['ids'][0]:
+        raise HTTPException(
+            status_code=404,
+            detail=f"TEMPLATE_MISSING: No fragment combination for stack '{request.stack}', "
+                   f"build tool '{request.build_tool}', framework '{request.framework}'. See GET /combinations."
+        )
+    combination_id = results['ids'][0][0]
+    combination = results['metadatas'][0][0]
+
+    # Step 2: Assemble both artifacts from (cached) fragments
+    dockerfile_refs = parse_refs(combination.get("dockerfile_fragments"))
+    gitlab_refs = parse_refs(combination.get("gitlab_fragments"))
+    fragments, cache_hits = fetch_fragments(dockerfile_refs + gitlab_refs)
+    dockerfile = compose_dockerfile(fragments[:len(dockerfile_refs)])
+    gitlab_ci = compose_gitlab_ci(fragments[len(dockerfile_refs):])
+
+    # Step 3: Fill placeholders and pick the runtime image like /generate/dockerfile
+    dockerfile = dockerfile.replace("${BASE_REGISTRY}", "localhost:5001")
+    dockerfile = dockerfile.replace("ARG BASE_REGISTRY=ai-nexus:5001", f"# Composed: {combination_id}")
+    dockerfile, runtime_image, pull_size = apply_runtime_image(dockerfile, combination["stack"])
+    if request.workdir != "/app":
+        dockerfile = dockerfile.replace("/app", request.workdir)
+    if request.port != 8080:
+        dockerfile = dockerfile.replace("8080", str(request.port))
+
+    # Step 4: Validate
+    check_public_registries(dockerfile)
+
+    dockerignore_file = DOCKERIGNORE_DIR / f"{combination['stack']}.dockerignore"
+    dockerignore = dockerignore_file.read_text(encoding="utf-8") if dockerignore_file.exists() else None
+
+    logger.info(f"Composed: combination={combination_id}, fragments={len(fragments)}, cache_hits={cache_hits}")
+
+    return {
+        "dockerfile": dockerfile,
+        "gitlab_ci": gitlab_ci,
+        "dockerignore": dockerignore,
+        "audit": {
+            "combination_id": combination_id,
+            "stack": combination["stack"],
+            "build_tool": combination["build_tool"],
+            "framework": combination["framework"],
+            "fragments": [f["id"] for f in fragments],
+            "fragment_cache_hits": cache_hits,
+            "runtime_image": runtime_image,
+            "expected_pull_bytes": pull_size,
+            "expected_pull_mb": round(pull_size / 1e6, 1) if pull_size else None,
+            "port": request.port,
+            "workdir": request.workdir,
+            "generated_at": datetime.utcnow().isoformat()
+        }
+    }
+
+def _chunk_results(results):
+    """Flatten a ChromaDB query result into a list of chunk dicts"""
+    chunks = []
+    for i, chunk_id in enumerate(results['ids'][0]):
+        metadata = results['metadatas'][0][i] if results['metadatas'][0] else {}
+        chunks.append({
+            "id": chunk_id,
+            "parent_id": metadata.get("parent_id"),
+            "section": metadata.get("section"),
+            "content": results['documents'][0][i],
+            "metadata": metadata
+        })
+    return chunks
+
+@app.get("/retrieve/rules")
+def retrieve_rules(query: str, n_results: int = 3):
+    """Retrieve only the golden rule sections relevant to a query"""
+    try:
+        results = golden_rules_collection.query(query_texts=[query], n_results=n_results)
+    except Exception as e:
+        logger.error(f"ChromaDB query failed: {e}")
+        raise HTTPException(status_code=500, detail=f"ChromaDB query error: {str(e)}")
+    return {"query": query, "sections": _chunk_results(results)}
+
+@app.get("/retrieve/jobs")
+def retrieve_jobs(stack: str, query: str = "", stage: Optional[str] = None, n_results: int = 3):
+    """Retrieve individual GitLab CI jobs for a stack, optionally limited to one stage"""
+    where = {"$and": [{"stack": stack}, {"stage": stage}]} if stage else {"stack": stack}
+    try:
+        results = gitlab_jobs_collection.query(
+            query_texts=[f"{stack} {stage or ''} {query}".strip()],
+            n_results=n_results,
+            where=where
+        )
+    except Exception as e:
+        logger.error(f"ChromaDB query failed: {e}")
+        raise HTTPException(status_code=500, detail=f"ChromaDB query error: {str(e)}")
+
+    if not results['ids'][0]:
+        raise HTTPException(
+            status_code=404,
+            detail=f"TEMPLATE_MISSING: No GitLab CI jobs for stack '{stack}'. "
+                   f"Run 'python ingest_templates.py' to load templates."
+        )
+    return {"stack": stack, "stage": stage, "jobs": _chunk_results(results)}
+
 @app.post("/validate/dockerfile")
 def validate_dockerfile(content: dict):
-    """Validate a Dockerfile against golden rules"""
+    """Validate a Dockerfile against golden rules and score its layer caching and image size.
+    Pass "rewrite": true to also get the Dockerfile with every fixable finding applied"""
     dockerfile_content = content.get("content", "")
     issues = []
 
@@ -227,7 +527,18 @@ def validate_dockerfile(content: dict):
     if "localhost:5001" not in dockerfile_content and "ai-nexus:5001" not in dockerfile_content:
         issues.append("No private registry (localhost:5001 or ai-nexus:5001) reference found")
 
-    return {"valid": len(issues) == 0, "issues": issues}
+    # Layer-cache and image-size analysis; findings are advice and do not affect "valid"
+    analysis = analyze_dockerfile(dockerfile_content)
+    result = {"valid": len(issues) == 0, "issues": issues, "analysis": analysis}
+    if content.get("rewrite"):
+        rewritten = rewrite_dockerfile(dockerfile_content)
+        result["rewritten"] = rewritten if rewritten != dockerfile_content else None
+        if result["rewritten"]:
+            after = analyze_dockerfile(rewritten)
+            result["rewritten_scores"] = {"cache_score": after["cache_score"], "size_score": after["size_score"]}
+    logger.info(f"Dockerfile validated: issues={len(issues)}, findings={len(analysis['findings'])}, "
+                f"cache_score={analysis['cache_score']}, size_score={analysis['size_score']}")
+    return result
 
 @app.post("/validate/gitlabci")
 def validate_gitlab_ci(content: dict):
@@ -3,16 +3,22 @@ import json
 import os
 from pathlib import Path
 
+from chunking import chunk_gitlab_ci, chunk_markdown
+from template_composer import build_combinations, load_fragments
+
 # Connect to ChromaDB
 client = chromadb.HttpClient(host='localhost', port=8000)
 
 # Get collections
 dockerfile_collection = client.get_collection("templates_dockerfile")
 gitlab_collection = client.get_collection("templates_gitlab")
+gitlab_jobs_collection = client.get_collection("templates_gitlab_jobs")
+fragments_collection = client.get_collection("templates_fragments")
+combinations_collection = client.get_collection("templates_combinations")
 golden_rules_collection = client.get_collection("golden_rules")
 
 # Counters
-counts = {"dockerfiles": 0, "gitlab": 0, "golden_rules": 0}
+counts = {"dockerfiles": 0, "gitlab": 0, "gitlab_jobs": 0, "fragments": 0, "combinations": 0, "golden_rules": 0}
 
 def prepare_metadata(metadata):
     """Convert lists to comma-separated strings for ChromaDB compatibility"""
@@ -24,6 +30,28 @@ def prepare_metadata(metadata):
             prepared[key] = value
     return prepared
 
+def upsert_chunks(collection, parent_id, chunks):
+    """Replace all chunks of a parent document so removed sections do not linger"""
+    collection.delete(where={"parent_id": parent_id})
+    if chunks:
+        collection.upsert(
+            ids=[c["id"] for c in chunks],
+            documents=[c["document"] for c in chunks],
+            metadatas=[c["metadata"] for c in chunks]
+        )
+    return len(chunks)
+
+def replace_documents(collection, template_type, documents):
+    """Replace every document of one template_type so removed fragments or combinations do not linger"""
+    collection.delete(where={"template_type": template_type})
+    if documents:
+        collection.upsert(
+            ids=[d["id"] for d in documents],
+            documents=[d["document"] for d in documents],
+            metadatas=[prepare_metadata(d["metadata"]) for d in documents]
+        )
+    return len(documents)
+
 # Ingest Dockerfiles
 dockerfile_dir = Path("rag-ai/rag_corpus/dockerfiles")
 for dockerfile in dockerfile_dir.glob("*.dockerfile"):
@@ -65,26 +93,39 @@ for gitlab_file in gitlab_dir.glob("*.yml"):
         )
         counts["gitlab"] += 1
         print(f"[OK] Ingested GitLab CI: {gitlab_file.name}")
+
+        # Index each job separately for stage-level retrieval
+        job_chunks = chunk_gitlab_ci(content, gitlab_file.stem, prepare_metadata(metadata))
+        counts["gitlab_jobs"] += upsert_chunks(gitlab_jobs_collection, gitlab_file.stem, job_chunks)
+        print(f"  [OK] Indexed {len(job_chunks)} job chunks")
     else:
         print(f"[SKIP] No metadata for: {gitlab_file.name}")
 
+# Ingest template fragments and the combination index built from them
+fragments = load_fragments("rag-ai/rag_corpus/fragments")
+combinations = build_combinations(fragments)
+counts["fragments"] += replace_documents(fragments_collection, "fragment", fragments)
+counts["combinations"] += replace_documents(combinations_collection, "combination", combinations)
+print(f"[OK] Ingested {len(fragments)} fragments composing {len(combinations)} combinations")
+
 # Ingest Golden Rules
 golden_rules_file = Path("rag-ai/rag_corpus/rag_specs/golden_rules.md")
 if golden_rules_file.exists():
     with open(golden_rules_file, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    golden_rules_collection.upsert(
-        ids=["golden_rules_v1"],
-        documents=[content],
-        metadatas=[{"type": "constraints", "priority": "critical"}]
-    )
-    counts["golden_rules"] += 1
-    print(f"[OK] Ingested: {golden_rules_file.name}")
+    # Rules are stored per section only; retrieving the whole file wastes prompt tokens
+    golden_rules_collection.delete(ids=["golden_rules_v1"])
+    rule_chunks = chunk_markdown(content, "golden_rules_v1", {"type": "constraints", "priority": "critical"})
+    counts["golden_rules"] += upsert_chunks(golden_rules_collection, "golden_rules_v1", rule_chunks)
+    print(f"[OK] Ingested: {golden_rules_file.name} ({len(rule_chunks)} sections)")
 
 # Summary
 print(f"\nIngestion Summary:")
 print(f"  Dockerfiles: {counts['dockerfiles']}")
 print(f"  GitLab CI: {counts['gitlab']}")
-print(f"  Golden Rules: {counts['golden_rules']}")
+print(f"  GitLab CI jobs: {counts['gitlab_jobs']}")
+print(f"  Fragments: {counts['fragments']}")
+print(f"  Combinations: {counts['combinations']}")
+print(f"  Golden Rules sections: {counts['golden_rules']}")
 print(f"  Total: {sum(counts.values())}")
@@ -0,0 +1,13 @@
+"""
+ChromaDB collections of the generator, shared by create_collections.py (which
+creates them) and benchmark_retrieval.py (which writes index settings for each).
+"""
+
+COLLECTIONS = [
+    "templates_dockerfile",
+    "templates_gitlab",
+    "templates_gitlab_jobs",
+    "templates_fragments",
+    "templates_combinations",
+    "golden_rules"
+]
@@ -0,0 +1,37 @@
+"""
+Image manifest lookups against the Nexus Docker registry (Registry HTTP API v2).
+
+Shared by catalog_refresh.py, which records every tag's compressed size in
+catalog.json, and generator_api.py, which asks the registry directly for
+images whose size the catalog does not have yet.
+"""
+import requests
+
+MANIFEST_ACCEPT = ", ".join([
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.oci.image.index.v1+json",
+])
+
+def get_manifest(registry_url, repo_name, reference, auth, timeout=10):
+    """Fetch one image manifest (tag or digest)"""
+    response = requests.get(
+        f"{registry_url}/v2/{repo_name}/manifests/{reference}",
+        auth=auth,
+        headers={"Accept": MANIFEST_ACCEPT},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()
+
+def compressed_size(registry_url, repo_name, tag, auth, timeout=10):
+    """Compressed pull size of one image in bytes (config + layers); linux/amd64 for multi-arch images.
+    Raises requests exceptions when the registry cannot be reached or has no such image"""
+    manifest = get_manifest(registry_url, repo_name, tag, auth, timeout)
+    if "manifests" in manifest:
+        platforms = manifest["manifests"]
+        amd64 = next((m for m in platforms if m.get("platform", {}).get("architecture") == "amd64"), platforms[0])
+        manifest = get_manifest(registry_url, repo_name, amd64["digest"], auth, timeout)
+    layers = manifest.get("layers", [])
+    return manifest.get("config", {}).get("size", 0) + sum(layer.get("size", 0) for layer in layers)
@@ -0,0 +1,142 @@
+"""
+Compose Dockerfiles and GitLab CI pipelines from reusable fragments.
+
+A fragment is one piece of an artifact: a Dockerfile builder stage, runtime
+stage, dependency layer or application layer, or one GitLab CI job (plus the
+shared variables block). Fragments declare the stack, build tool and framework
+they apply to in their .meta.json; a missing field matches any value. For each
+(stack, build_tool, framework) combination the most specific fragment of every
+kind is picked, so builders x frameworks templates come from builders +
+frameworks files.
+
+The combination index lists every valid combination with the fragment IDs it
+uses, each suffixed with the fragment's content hash ("id@hash"). Callers cache
+fragments by that reference: a re-ingested fragment gets a new reference and is
+fetched again, unchanged ones are shared across all combinations.
+"""
+import hashlib
+import itertools
+import json
+from pathlib import Path
+
+# Fragment kinds in assembly order; a GitLab kind is also the stage of its job
+KINDS = {
+    "dockerfile": ["builder", "runtime", "deps", "app"],
+    "gitlab": ["variables", "test", "build", "security", "quality", "push", "notify"],
+}
+REQUIRED_KINDS = {
+    "dockerfile": ["runtime", "app"],
+    "gitlab": ["variables", "build"],
+}
+FRAGMENT_SUFFIXES = {".dockerfile": "dockerfile", ".yml": "gitlab"}
+DIMENSIONS = ["stack", "build_tool", "framework"]
+DOCKERFILE_HEADER = "ARG BASE_REGISTRY=ai-nexus:5001"
+
+
+def _content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def fragment_ref(fragment):
+    """Cache key of a fragment: its ID and content hash"""
+    return f"{fragment['id']}@{fragment['metadata']['content_hash']}"
+
+
+def parse_refs(value):
+    """Fragment references from a comma-separated combination metadata field"""
+    return [ref for ref in (value or "").split(",") if ref]
+
+
+def load_fragments(root):
+    """Read every fragment under `root` that has a .meta.json next to it"""
+    fragments = []
+    for path in sorted(Path(root).rglob("*")):
+        artifact = FRAGMENT_SUFFIXES.get(path.suffix)
+        meta_file = path.with_suffix(".meta.json")
+        if not artifact or not meta_file.exists():
+            continue
+        content = path.read_text(encoding="utf-8").strip() + "\n"
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        metadata.update({"artifact": artifact, "content_hash": _content_hash(content)})
+        fragments.append({"id": f"fragment-{path.stem}", "document": content, "metadata": metadata})
+    return fragments
+
+
+def _specificity(metadata, combination):
+    """How many dimensions a fragment pins for `combination`; None when it does not apply"""
+    score = 0
+    for dimension in DIMENSIONS:
+        if dimension in metadata:
+            if metadata[dimension] != combination[dimension]:
+                return None
+            score += 1
+    return score
+
+
+def select_fragments(fragments, combination):
+    """Most specific fragment of each kind for one combination, as {artifact: [fragment, ...]}"""
+    selected = {}
+    for artifact, kinds in KINDS.items():
+        selected[artifact] = []
+        for kind in kinds:
+            best, best_score = None, -1
+            for fragment in fragments:
+                metadata = fragment["metadata"]
+                if metadata["artifact"] != artifact or metadata["kind"] != kind:
+                    continue
+                score = _specificity(metadata, combination)
+                if score is not None and score > best_score:
+                    best, best_score = fragment, score
+            if best:
+                selected[artifact].append(best)
+    return selected
+
+
+def build_combinations(fragments):
+    """Combination index: every (stack, build_tool, framework) whose required kinds all resolve.
+
+    Build tools and frameworks are those named by any fragment of the stack.
+    Returns records shaped like ChromaDB upserts (id, document, metadata).
+    """
+    values = {}
+    for fragment in fragments:
+        metadata = fragment["metadata"]
+        if "stack" not in metadata:
+            continue
+        dims = values.setdefault(metadata["stack"], {"build_tool": set(), "framework": set()})
+        for dimension in dims:
+            if dimension in metadata:
+                dims[dimension].add(metadata[dimension])
+
+    combinations = []
+    for stack, dims in sorted(values.items()):
+        for build_tool, framework in itertools.product(sorted(dims["build_tool"]), sorted(dims["framework"])):
+            combination = {"stack": stack, "build_tool": build_tool, "framework": framework}
+            selected = select_fragments(fragments, combination)
+            kinds = {artifact: {f["metadata"]["kind"] for f in chosen} for artifact, chosen in selected.items()}
+            if any(set(required) - kinds[artifact] for artifact, required in REQUIRED_KINDS.items()):
+                continue
+            metadata = dict(combination, template_type="combination")
+            for artifact, chosen in selected.items():
+                metadata[f"{artifact}_fragments"] = ",".join(fragment_ref(f) for f in chosen)
+            combinations.append({
+                "id": f"{stack}-{build_tool}-{framework}",
+                "document": f"{stack} {framework} application built with {build_tool}: "
+                            f"multi-stage Dockerfile and GitLab CI pipeline",
+                "metadata": metadata,
+            })
+    return combinations
+
+
+def compose_dockerfile(fragments):
+    """Dockerfile from its fragments in assembly order"""
+    return "\n\n".join([DOCKERFILE_HEADER] + [f["document"].strip() for f in fragments]) + "\n"
+
+
+def compose_gitlab_ci(fragments):
+    """.gitlab-ci.yml from its fragments; stages are those of the included jobs"""
+    kinds = [f["metadata"]["kind"] for f in fragments]
+    stages = [kind for kind in KINDS["gitlab"] if kind != "variables" and kind in kinds]
+    header = "stages:\n" + "".join(f"  - {stage}\n" for stage in stages)
+    return "\n".join([header] + [f["document"].strip() + "\n" for f in fragments])
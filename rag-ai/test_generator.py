@@ -11,6 +11,8 @@ import sys
 import yaml
 from datetime import datetime
 
+from rag_collections import COLLECTIONS
+
 # Configuration
 CHROMADB_HOST = "localhost"
 CHROMADB_PORT = 8000
@@ -87,7 +89,7 @@ def test_chromadb_collections():
         import chromadb
         client = chromadb.HttpClient(host=CHROMADB_HOST, port=CHROMADB_PORT)
 
-        collections_to_check = ["templates_dockerfile", "templates_gitlab", "golden_rules"]
+        collections_to_check = COLLECTIONS
         all_ok = True
 
         for col_name in collections_to_check:
@@ -154,11 +156,11 @@ def test_chromadb_retrieval_all_stacks():
 # PHASE 3: API Generation Tests
 # =============================================================================
 
-def test_generate_dockerfile(stack, framework=None, port=8080, workdir="/app"):
+def test_generate_dockerfile(stack, framework=None, port=8080, workdir="/app", variant="classic"):
     """Test Dockerfile generation via API"""
-    test_name = f"generate_dockerfile_{stack}"
+    test_name = f"generate_dockerfile_{stack}" + (f"_{variant}" if variant != "classic" else "")
     try:
-        payload = {"stack": stack, "port": port, "workdir": workdir}
+        payload = {"stack": stack, "port": port, "workdir": workdir, "variant": variant}
         if framework:
             payload["framework"] = framework
 
@@ -173,13 +175,26 @@ def test_generate_dockerfile(stack, framework=None, port=8080, workdir="/app"):
             content = data.get("content", "")
             audit = data.get("audit", {})
 
+            if variant == "optimized" and "--mount=type=cache" not in content:
+                record(test_name, "failed", "Optimized variant without BuildKit cache mount")
+                return None, None
+
             # Save generated Dockerfile
-            output_file = f"{OUTPUT_DIR}/dockerfiles/Dockerfile.{stack}"
+            output_file = f"{OUTPUT_DIR}/dockerfiles/Dockerfile.{stack}" + (f".{variant}" if variant != "classic" else "")
             with open(output_file, 'w') as f:
                 f.write(content)
 
+            if stack == "java" and "-jdk" in (audit.get("runtime_image") or ""):
+                record(test_name, "failed", f"JDK runtime image: {audit['runtime_image']}")
+                return None, None
+
+            if not audit.get("expected_pull_bytes"):
+                record(test_name, "failed", f"No pull size reported for runtime image {audit.get('runtime_image')}")
+                return None, None
+
             record(test_name, "passed",
-                   f"Generated ({len(content)} chars), base: {audit.get('base_image', 'N/A')}")
+                   f"Generated ({len(content)} chars), base: {audit.get('base_image', 'N/A')}, "
+                   f"runtime: {audit.get('runtime_image', 'N/A')} ({audit['expected_pull_mb']} MB)")
             return content, audit
         else:
             error = resp.json().get("detail", resp.text)
@@ -228,6 +243,45 @@ def test_generate_gitlab_ci(stack, build_tool=None):
         return None, None
 
 
+def test_generate_composed(stack, build_tool=None, framework=None):
+    """Test fragment-composed Dockerfile + GitLab CI generation via API"""
+    test_name = f"generate_composed_{stack}_{build_tool or 'any'}_{framework or 'any'}"
+    try:
+        payload = {"stack": stack, "build_tool": build_tool, "framework": framework}
+        resp = requests.post(
+            f"http://{API_HOST}:{API_PORT}/generate/composed",
+            json=payload,
+            timeout=10
+        )
+
+        if resp.status_code == 200:
+            data = resp.json()
+            audit = data.get("audit", {})
+            if "FROM " not in data.get("dockerfile", "") or "stages:" not in data.get("gitlab_ci", ""):
+                record(test_name, "failed", "Composed output missing FROM or stages")
+                return None, None
+            if not audit.get("expected_pull_bytes"):
+                record(test_name, "failed", f"No pull size reported for runtime image {audit.get('runtime_image')}")
+                return None, None
+
+            output_file = f"{OUTPUT_DIR}/dockerfiles/Dockerfile.{audit.get('combination_id', stack)}"
+            with open(output_file, 'w') as f:
+                f.write(data["dockerfile"])
+
+            record(test_name, "passed",
+                   f"Composed {audit.get('combination_id', 'N/A')} from {len(audit.get('fragments', []))} fragments "
+                   f"({audit.get('fragment_cache_hits', 0)} cached), runtime: {audit['runtime_image']} ({audit['expected_pull_mb']} MB)")
+            return data, audit
+        else:
+            error = resp.json().get("detail", resp.text)
+            record(test_name, "failed", f"HTTP {resp.status_code}: {error}")
+            return None, None
+
+    except Exception as e:
+        record(test_name, "failed", f"Error: {e}")
+        return None, None
+
+
 def test_generate_invalid_stack():
     """Test generation with invalid stack returns proper error"""
     try:
@@ -291,6 +345,76 @@ def validate_dockerfile(content, stack):
         record(test_name, "passed", "All validation rules passed")
 
 
+def test_dockerfile_analysis():
+    """Test /validate/dockerfile scores a cache-unfriendly Dockerfile and rewrites it"""
+    test_name = "validate_dockerfile_analysis"
+    dockerfile = (
+        "FROM localhost:5001/apm-repo/demo/python:3.12-slim\n"
+        "WORKDIR /app\n"
+        "COPY . .\n"
+        "RUN pip install -r requirements.txt\n"
+        "EXPOSE 8080\n"
+        'CMD ["python", "app.py"]\n'
+    )
+    try:
+        resp = requests.post(
+            f"http://{API_HOST}:{API_PORT}/validate/dockerfile",
+            json={"content": dockerfile, "rewrite": True},
+            timeout=10
+        )
+        if resp.status_code != 200:
+            record(test_name, "failed", f"HTTP {resp.status_code}")
+            return
+        data = resp.json()
+        rules = [f["rule"] for f in data.get("analysis", {}).get("findings", [])]
+        rewritten_scores = data.get("rewritten_scores") or {}
+        if "copy-before-dependencies" not in rules:
+            record(test_name, "failed", f"COPY . . before pip install not reported: {rules}")
+        elif rewritten_scores.get("cache_score", 0) <= data["analysis"]["cache_score"]:
+            record(test_name, "failed", f"Rewrite did not improve the cache score: {rewritten_scores}")
+        else:
+            record(test_name, "passed",
+                   f"cache {data['analysis']['cache_score']} -> {rewritten_scores['cache_score']}, findings: {rules}")
+    except Exception as e:
+        record(test_name, "failed", f"Error: {e}")
+
+
+def test_dockerfile_rewrite_nested_manifest():
+    """Test the /validate/dockerfile rewrite keeps a nested manifest's directory and drops apk update"""
+    test_name = "validate_dockerfile_nested_manifest"
+    dockerfile = (
+        "FROM localhost:5001/apm-repo/demo/python:3.12-alpine\n"
+        "RUN apk update\n"
+        "RUN apk add --no-cache libpq\n"
+        "WORKDIR /app\n"
+        "COPY --chown=app:app . .\n"
+        "RUN pip install --no-cache-dir -r requirements/prod.txt\n"
+        'CMD ["python", "app.py"]\n'
+    )
+    try:
+        resp = requests.post(
+            f"http://{API_HOST}:{API_PORT}/validate/dockerfile",
+            json={"content": dockerfile, "rewrite": True},
+            timeout=10
+        )
+        if resp.status_code != 200:
+            record(test_name, "failed", f"HTTP {resp.status_code}")
+            return
+        data = resp.json()
+        rewritten = data.get("rewritten") or ""
+        rules = [f["rule"] for f in data.get("analysis", {}).get("findings", [])]
+        if "COPY --chown=app:app requirements/prod.txt requirements/\n" not in rewritten:
+            record(test_name, "failed", f"Manifest not copied into requirements/: {rewritten!r}")
+        elif "apk update" in rewritten or "apk-update-index" not in rules:
+            record(test_name, "failed", f"apk update not reported or kept in the rewrite (findings: {rules})")
+        elif (data.get("rewritten_scores") or {}).get("size_score") != 100:
+            record(test_name, "failed", f"Rewrite still loses size points: {data.get('rewritten_scores')}")
+        else:
+            record(test_name, "passed", f"findings: {rules}, rewritten scores: {data['rewritten_scores']}")
+    except Exception as e:
+        record(test_name, "failed", f"Error: {e}")
+
+
 def validate_gitlab_ci(content, stack):
     """Validate generated GitLab CI against golden rules"""
     test_name = f"validate_gitlabci_{stack}"
@@ -440,6 +564,15 @@ def main():
     node_df, node_df_audit = test_generate_dockerfile("node", framework="express", port=3000)
     node_ci, node_ci_audit = test_generate_gitlab_ci("node", build_tool="npm")
 
+    # BuildKit cache-mount variants
+    for stack in ["java", "python", "node"]:
+        test_generate_dockerfile(stack, variant="optimized")
+
+    # Fragment-composed combinations
+    test_generate_composed("java", build_tool="maven", framework="micronaut")
+    test_generate_composed("python", build_tool="poetry", framework="fastapi")
+    test_generate_composed("node", build_tool="yarn")
+
     # Invalid stack
     test_generate_invalid_stack()
 
@@ -451,6 +584,8 @@ def main():
     validate_gitlab_ci(java_ci, "java")
     validate_gitlab_ci(python_ci, "python")
     validate_gitlab_ci(node_ci, "node")
+    test_dockerfile_analysis()
+    test_dockerfile_rewrite_nested_manifest()
 
     # Phase 5: Catalog
     print("\n--- PHASE 5: Catalog Validation ---")
@@ -15,9 +15,11 @@ except Exception as e:
 try:
     dockerfile_collection = client.get_collection("templates_dockerfile")
     gitlab_collection = client.get_collection("templates_gitlab")
+    gitlab_jobs_collection = client.get_collection("templates_gitlab_jobs")
     golden_rules_collection = client.get_collection("golden_rules")
     print(f"[OK] Collections loaded - Dockerfiles: {dockerfile_collection.count()}, "
-          f"GitLab: {gitlab_collection.count()}, Rules: {golden_rules_collection.count()}")
+          f"GitLab: {gitlab_collection.count()}, GitLab jobs: {gitlab_jobs_collection.count()}, "
+          f"Rule sections: {golden_rules_collection.count()}")
 except Exception as e:
     print(f"[ERROR] Collections not found: {e}")
     print("  Run: python ingest_templates.py")
@@ -91,6 +93,24 @@ else:
     print("  [FAIL] No golden rules found")
     failed += 1
 
+# Test stage-level job retrieval
+test_num += 1
+print(f"\n{'=' * 60}")
+print(f"TEST {test_num}: Retrieve single quality job for stack='java'")
+print("=" * 60)
+results = gitlab_jobs_collection.query(
+    query_texts=["java sonarqube quality analysis"],
+    n_results=1,
+    where={"$and": [{"stack": "java"}, {"stage": "quality"}]}
+)
+if results['ids'][0] and results['metadatas'][0][0].get("parent_id"):
+    print(f"  [PASS] Found: {results['ids'][0][0]} (parent: {results['metadatas'][0][0]['parent_id']})")
+    print(f"  Content preview: {results['documents'][0][0][:150]}...")
+    passed += 1
+else:
+    print("  [FAIL] No quality job chunk found for stack 'java'")
+    failed += 1
+
 # Summary
 print(f"\n{'=' * 60}")
 print(f"  RETRIEVAL TEST RESULTS: {passed} passed, {failed} failed, {test_num} total")
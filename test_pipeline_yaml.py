@@ -8,3 +8,15 @@ print(result[:2000])
 print("\n\n=== PYTHON COMPILE ONLY ===")
 result = module.get_pipeline_template("python", "compile")
 print(result)
+
+print("\n\n=== GRADLE UNIT TEST DISCOVERY WITHOUT src/test/kotlin ===")
+import os, subprocess, tempfile, yaml
+result = module.get_pipeline_template("gradle", "compile,unit_test")
+discovery = yaml.safe_load(result[result.index("stages:"):])["unit_tests"]["script"][0]
+project = tempfile.mkdtemp()
+os.makedirs(os.path.join(project, "src/test/java/com/example"))
+open(os.path.join(project, "src/test/java/com/example/AppTest.java"), "w").close()
+# GitLab Runner's bash shell runs job scripts under set -eo pipefail
+run = subprocess.run(["bash", "-c", "set -eo pipefail\n" + discovery], cwd=project, capture_output=True, text=True)
+found = open(os.path.join(project, "test-files.txt")).read().split() if run.returncode == 0 else []
+print("PASS" if found == ["src/test/java/com/example/AppTest.java"] else f"FAIL (exit {run.returncode}): {run.stderr or found}")